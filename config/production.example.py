@@ -3,4 +3,6 @@ import os
 DEBUG = False
 SECRET_KEY = os.environ.get('SALTSTATS_TEST_SECRET_KEY')
 SQLALCHEMY_DATABASE_URI = os.environ.get('SALTSTATS_TEST_DATABASE_URI')
+AUTH_CACHE_KEY = os.environ.get('SALTSTATS_AUTH_CACHE_KEY')
 LDAP_SERVER = 'your.server.address'
+LDAP_MAX_POOL_SIZE = 5
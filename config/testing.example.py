@@ -4,3 +4,4 @@ DEBUG = True
 SECRET_KEY = os.environ.get('SALTSTATS_TEST_SECRET_KEY')
 SQLALCHEMY_DATABASE_URI = os.environ.get('SALTSTATS_TEST_DATABASE_URI')
 LDAP_SERVER = 'your.server.address'
+LDAP_MAX_POOL_SIZE = 5
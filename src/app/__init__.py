@@ -1,14 +1,19 @@
+import atexit
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+from logging.handlers import MemoryHandler, RotatingFileHandler
 from flask import Flask
-from flask.ext.bootstrap import Bootstrap
-from flask.ext.login import LoginManager
-from flask.ext.sqlalchemy import SQLAlchemy
+from flask_bootstrap import Bootstrap
+from flask_caching import Cache
+from flask_compress import Compress
+from flask_login import LoginManager
+from flask_sqlalchemy import SQLAlchemy
 
 logger = None
 
 bootstrap = Bootstrap()
+cache = Cache()
+compress = Compress()
 db = SQLAlchemy()
 
 login_manager = LoginManager()
@@ -29,16 +34,33 @@ def create_app(config_name):
             '%(asctime)s %(levelname)s: %(message)s '
             '[in %(pathname)s:%(lineno)d]'
         ))
-        app.logger.addHandler(file_handler)
+
+        # buffer log records so that they are written to disk in batches
+        memory_handler = MemoryHandler(capacity=512, flushLevel=logging.ERROR, target=file_handler)
+        atexit.register(memory_handler.flush)
+        app.logger.addHandler(memory_handler)
         app.logger.setLevel(logging.DEBUG)
 
     global logger
     logger = app.logger
 
     bootstrap.init_app(app)
+    app.config.setdefault('CACHE_TYPE', 'simple')
+    app.config.setdefault('CACHE_DEFAULT_TIMEOUT', 900)
+    cache.init_app(app)
+    compress.init_app(app)
+
+    # pool sizes and recycling don't apply to SQLite, which doesn't use a connection pool
+    if not (app.config.get('SQLALCHEMY_DATABASE_URI') or '').startswith('sqlite'):
+        app.config.setdefault('SQLALCHEMY_POOL_SIZE', 10)
+        app.config.setdefault('SQLALCHEMY_MAX_OVERFLOW', 20)
+        app.config.setdefault('SQLALCHEMY_POOL_RECYCLE', 3600)
     db.init_app(app)
     login_manager.init_app(app)
 
+    from .auth.ldap_pool import init_ldap_pool
+    init_ldap_pool(app)
+
     from .main import main as main_blueprint
     app.register_blueprint(main_blueprint)
 
@@ -0,0 +1,137 @@
+import hashlib
+import hmac
+import os
+import threading
+
+from cachetools import TTLCache
+from ldap3 import Connection, IP_V4_PREFERRED, NONE, REUSABLE, Server, ServerPool
+
+_bind_lock = threading.Lock()
+
+
+def init_ldap_pool(app):
+    """Create the pool of LDAP connections used for searching the directory.
+
+    The pool is created once per application and is stored as `app.extensions['ldap_pool']`. Its connections are bound
+    with the service account given by the `LDAP_BIND_DN` and `LDAP_BIND_PASSWORD` settings (or anonymously, if these
+    aren't set). The number of connections in the pool is given by the `LDAP_MAX_POOL_SIZE` setting.
+
+    The connections aren't opened before they are needed for the first time, so that the application can be created
+    even if the LDAP server is unavailable.
+
+    The LDAP server is stored as `app.extensions['ldap_server']`, so that it can be reused for all binds. No schema or
+    server information is fetched from the server.
+
+    In addition a cache for login results is created and stored as `app.extensions['ldap_cache']`. See the
+    `LoginCache` class for details. Successful logins are cached for `LDAP_CACHE_TTL` seconds (five minutes by default),
+    so a password which is changed or revoked in LDAP may still be accepted for that long. The passwords are hashed
+    with the `AUTH_CACHE_KEY` setting, which must be set unless the application runs in debug or testing mode, so that
+    all worker processes use the same key.
+
+    Params:
+    -------
+    app : flask.Flask
+        Flask application.
+    """
+
+    server = Server(app.config['LDAP_SERVER'], get_info=NONE, mode=IP_V4_PREFERRED)
+    app.extensions['ldap_server'] = server
+
+    server_pool = ServerPool([server])
+    app.extensions['ldap_pool'] = Connection(server_pool,
+                                             user=app.config.get('LDAP_BIND_DN'),
+                                             password=app.config.get('LDAP_BIND_PASSWORD'),
+                                             client_strategy=REUSABLE,
+                                             pool_name='saltstats',
+                                             pool_size=app.config.get('LDAP_MAX_POOL_SIZE', 5),
+                                             pool_lifetime=app.config.get('LDAP_POOL_LIFETIME', 3600),
+                                             read_only=True)
+
+    cache_key = app.config.get('AUTH_CACHE_KEY')
+    if not cache_key:
+        if not (app.debug or app.testing):
+            raise ValueError('The AUTH_CACHE_KEY setting is required unless in debug or testing mode.')
+        cache_key = os.urandom(32)
+    app.extensions['ldap_cache'] = LoginCache(key=cache_key,
+                                              ttl=app.config.get('LDAP_CACHE_TTL', 300),
+                                              negative_ttl=app.config.get('LDAP_NEGATIVE_CACHE_TTL', 60))
+
+
+def search_connection(app):
+    """The pooled connection for searching the LDAP directory.
+
+    The connection is bound when it is requested for the first time.
+
+    Params:
+    -------
+    app : flask.Flask
+        Flask application.
+
+    Returns:
+    --------
+    ldap3.Connection
+        Connection for searching the directory.
+    """
+
+    conn = app.extensions['ldap_pool']
+    if not conn.bound:
+        with _bind_lock:
+            if not conn.bound:
+                conn.bind()
+    return conn
+
+
+class LoginCache:
+    """Cache for the results of LDAP logins.
+
+    Successful and failed logins are cached separately, with failed logins expiring more quickly. The cache is keyed by
+    the username and an HMAC of the password, so that no plaintext password is stored.
+
+    As the LDAP server isn't consulted for a cached successful login, `ttl` should be short (a few minutes), as it
+    determines how long a changed or revoked password remains valid.
+
+    Params:
+    -------
+    key : str or bytes
+        Key for the HMAC of the passwords.
+    ttl : float
+        Time (in seconds) after which a successful login expires.
+    negative_ttl : float
+        Time (in seconds) after which a failed login expires.
+    maxsize : int, optional
+        Maximum number of successful and failed logins to cache.
+    """
+
+    def __init__(self, key, ttl, negative_ttl, maxsize=1024):
+        self._key = key.encode('utf-8') if isinstance(key, str) else key
+        self._users = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._failures = TTLCache(maxsize=maxsize, ttl=negative_ttl)
+        self._lock = threading.RLock()
+
+    def user(self, username, password):
+        """The cached user for a successful login with the given credentials, or None if there is none."""
+
+        with self._lock:
+            return self._users.get(self._cache_key(username, password))
+
+    def is_failure(self, username, password):
+        """Whether a login with the given credentials is cached as having failed."""
+
+        with self._lock:
+            return self._cache_key(username, password) in self._failures
+
+    def add_user(self, username, password, user):
+        """Cache a successful login."""
+
+        with self._lock:
+            self._users[self._cache_key(username, password)] = user
+
+    def add_failure(self, username, password):
+        """Cache a failed login."""
+
+        with self._lock:
+            self._failures[self._cache_key(username, password)] = True
+
+    def _cache_key(self, username, password):
+        digest = hmac.new(self._key, password.encode('utf-8'), hashlib.sha256).digest()
+        return username, digest
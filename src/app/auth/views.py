@@ -1,12 +1,52 @@
 from flask import current_app, flash, redirect, render_template, request, url_for
-from flask.ext.login import login_required, login_user, logout_user
-from ldap3 import Server, Connection, SUBTREE
+from flask_login import login_required, login_user, logout_user
+from ldap3 import Connection, SUBTREE, SYNC
 from ldap3.core.exceptions import LDAPBindError
+from ldap3.utils.conv import escape_filter_chars
 
 from . import auth
 from .forms import LoginForm
+from .ldap_pool import search_connection
 from .user import User
 
+_USER_DN_TEMPLATE = 'uid={uid},ou=people,dc=saao'
+
+# characters which must be escaped anywhere in an attribute value of a DN (RFC 4514)
+_RDN_SPECIAL_CHARACTERS = frozenset(',+"\\<>;=')
+
+
+def escape_rdn(value):
+    r"""Escape an attribute value for use in a relative distinguished name (RDN), as described in RFC 4514.
+
+    The characters `,+"\<>;=` are escaped with a backslash, as are a leading '#' or space and a trailing space. The
+    null character is replaced with '\00'.
+
+    Params:
+    -------
+    value : str
+        Attribute value.
+
+    Returns:
+    --------
+    str
+        The escaped value.
+
+    Examples:
+    ---------
+    >>> escape_rdn('john,ou=admins')
+    'john\\,ou\\=admins'
+    >>> escape_rdn('# john ')
+    '\\# john\\ '
+    """
+
+    chars = ['\\' + c if c in _RDN_SPECIAL_CHARACTERS else c for c in value]
+    chars = ['\\00' if c == '\x00' else c for c in chars]
+    if chars and chars[0] in ('#', ' '):
+        chars[0] = '\\' + chars[0]
+    if chars and chars[-1] == ' ':
+        chars[-1] = '\\ '
+    return ''.join(chars)
+
 
 def find_user(username, password):
     """Query the LDAP server for the user with the given user credentials. The username, first name
@@ -14,24 +54,49 @@ def find_user(username, password):
     :code:`surname`.
 
     If the user doesn't exist (or the password is wrong), :code:`None` is returned.
+
+    The user's credentials are only used for a short-lived bind verifying the password. The user details are then
+    queried with a connection from the pool of (already bound) search connections.
+
+    Successful and failed logins are cached, so that the LDAP server is only queried if there is no cached result for
+    the credentials.
     """
 
-    server = Server(current_app.config['LDAP_SERVER'])
+    cache = current_app.extensions['ldap_cache']
+    user = cache.user(username, password)
+    if user:
+        return user
+    if cache.is_failure(username, password):
+        return None
+
+    server = current_app.extensions['ldap_server']
     try:
-        conn = Connection(server, 'uid={0}, ou=people, dc=saao'.format(username), password, auto_bind=True)
-        results = conn.extend.standard.paged_search(search_base='dc=saao',
-                                                    search_scope=SUBTREE,
-                                                    search_filter='(uid={0})'.format(username),
-                                                    attributes=['givenName', 'sn'],
-                                                    generator=False)
-        # TO DO: store user in database, so that load_user can use it
-        return User()
-        # return User(username=username,
-        #             first_name=results[0]['attributes']['givenName'][0],
-        #             surname=results[0]['attributes']['surname'][0])
+        user_conn = Connection(server,
+                               _USER_DN_TEMPLATE.format(uid=escape_rdn(username)),
+                               password,
+                               auto_bind=True,
+                               client_strategy=SYNC,
+                               read_only=True)
+        user_conn.unbind()
     except LDAPBindError:
+        cache.add_failure(username, password)
         return None
 
+    conn = search_connection(current_app)
+    msg_id = conn.search(search_base='dc=saao',
+                         search_scope=SUBTREE,
+                         search_filter='(uid={0})'.format(escape_filter_chars(username)),
+                         attributes=['givenName', 'sn'],
+                         size_limit=1)
+    results, _ = conn.get_response(msg_id)
+    # TO DO: store user in database, so that load_user can use it
+    user = User()
+    cache.add_user(username, password, user)
+    return user
+    # return User(username=username,
+    #             first_name=results[0]['attributes']['givenName'][0],
+    #             surname=results[0]['attributes']['surname'][0])
+
 
     #
     # auth_method = current_app.config['AUTH_METHOD']
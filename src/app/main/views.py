@@ -1,15 +1,18 @@
 import datetime
+import functools
 
-from flask import flash, redirect, render_template, url_for
-from flask.ext.login import login_required
-from flask.ext.wtf import Form
+from flask import flash, redirect, render_template, request, url_for
+from flask_login import login_required
+from flask_wtf import Form
 from wtforms import FileField, SubmitField
 from wtforms.validators import DataRequired
 
+from .. import cache, db
 from ..main import main
 from ..plot.block_visits import BlockVisitPlots
 from ..plot.engineering_time import EngineeringTimePlots
 from ..plot.operation_efficiency import OperationEfficiencyPlots
+from ..plot.queries import DateRangeQueries
 from ..plot.science_time import ScienceTimePlots
 from ..plot.shutter_open_efficiency import ShutterOpenEfficiencyPlots
 from ..plot.telescope_downtime import TelescopeDowntimePlots
@@ -17,32 +20,91 @@ from ..plot.weather_downtime import WeatherDowntimePlots
 
 from ..plot.mirror_recoating import MirrorRecoatingPlot, update_database
 
+
 @main.route('/')
 @login_required
 def home():
     return render_template('home.html')
 
+
+def _dashboard_cache_key(name):
+    """Prefix for the cache keys of the plots with the given name on the dashboard. The prefix changes daily."""
+
+    return '{path}/{date}/{name}'.format(path=request.path, date=datetime.date.today(), name=name)
+
+
+class _CachedPlots:
+    """Proxy for a plots object which caches the HTML of the plots.
+
+    Calling a plot method of the proxy returns the HTML of the plot returned by the same method of the plots object
+    with the same arguments. The HTML is cached with Flask-Caching, using `key` and the method name and arguments as
+    the cache key. The plots object is only created (by calling `create_plots`) when a plot isn't cached.
+
+    Only the methods listed in `_PLOT_METHODS` are proxied, and only if `plots_class` has them. Accessing any other
+    attribute raises an AttributeError.
+
+    Params:
+    -------
+    key : str
+        Prefix for the cache keys.
+    plots_class : class
+        Class of the plots object.
+    create_plots : function
+        Function creating the plots object. It must not require any arguments.
+    """
+
+    _PLOT_METHODS = frozenset(['last_night_plot', 'week_to_date_plot', 'daily_plot', 'monthly_plot',
+                               'semester_to_date_plot', 'year_to_date_plot'])
+
+    def __init__(self, key, plots_class, create_plots):
+        self._key = key
+        self._plots_class = plots_class
+        self._create_plots = create_plots
+        self._plots = None
+
+    def __getattr__(self, name):
+        if name not in self._PLOT_METHODS or not callable(getattr(self._plots_class, name, None)):
+            raise AttributeError('{cls} has no plot method {name}'.format(cls=self._plots_class.__name__, name=name))
+
+        def plot_html(*args):
+            key = '{key}/{name}{args}'.format(key=self._key, name=name, args=args)
+            html = cache.get(key)
+            if html is None:
+                if self._plots is None:
+                    self._plots = self._create_plots()
+                html = str(getattr(self._plots, name)(*args))
+                cache.set(key, html)
+            return html
+
+        return plot_html
+
+
 @main.route('/dashboard', methods=['GET'])
 @login_required
 def dashboard():
     date = datetime.date(2016, 3, 29)
 
-    block_visits = BlockVisitPlots(date)
-    science_time = ScienceTimePlots(date)
-    weather_downtime = WeatherDowntimePlots(date)
-    telescope_downtime = TelescopeDowntimePlots(date)
-    engineering_time = EngineeringTimePlots(date)
-    shutter_open_efficiency = ShutterOpenEfficiencyPlots(date)
-    operation_efficiency = OperationEfficiencyPlots(date)
-
-    return render_template('dashboard.html',
-                           block_visits=block_visits,
-                           science_time=science_time,
-                           weather_downtime=weather_downtime,
-                           telescope_downtime=telescope_downtime,
-                           engineering_time=engineering_time,
-                           shutter_open_efficiency=shutter_open_efficiency,
-                           operation_efficiency=operation_efficiency)
+    # all the plots share the same queries, so that each query is run only once
+    queries = DateRangeQueries(date - datetime.timedelta(days=300), date + datetime.timedelta(days=150), db.engine)
+
+    plots_classes = dict(block_visits=BlockVisitPlots,
+                         science_time=ScienceTimePlots,
+                         weather_downtime=WeatherDowntimePlots,
+                         telescope_downtime=TelescopeDowntimePlots,
+                         engineering_time=EngineeringTimePlots,
+                         shutter_open_efficiency=ShutterOpenEfficiencyPlots,
+                         operation_efficiency=OperationEfficiencyPlots)
+
+    def create_plots(cls):
+        # as soon as any plot has to be created, run the queries for the rendered tabs (science time, blocks, weather
+        # and telescope downtime) concurrently rather than one by one
+        queries.prefetch('time_breakdown', 'observation_time_and_block_visits')
+        return cls(date, queries=queries)
+
+    plots = {name: _CachedPlots(_dashboard_cache_key(name), cls, functools.partial(create_plots, cls))
+             for name, cls in plots_classes.items()}
+
+    return render_template('dashboard.html', **plots)
 
 
 class RecoatingForm(Form):
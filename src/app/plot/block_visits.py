@@ -1,13 +1,13 @@
 import datetime
 import functools
 
+import numpy as np
 from bokeh.models import Range1d
 from app import db
 from app.plot.plot import DialPlot
-from app.plot.queries import DateRangeQueries
+from app.plot.queries import DateRangeQueries, EXECUTOR
 from app.plot.util import daily_bar_plot, day_range, day_running_average,\
-                          monthly_bar_plot, month_range, month_running_average,\
-                          value_last_night, value_last_week
+                          monthly_bar_plot, month_range, month_running_average, to_date_values
 
 
 class BlockVisitPlots:
@@ -17,18 +17,38 @@ class BlockVisitPlots:
     -------
     date : datetime.date
         The date for which to generate the plots.
+    queries : app.plot.queries.DateRangeQueries, optional
+        Queries to use for obtaining the data. Their date range must include the 300 days before and the 150 days after
+        `date`. By default new queries are created.
     **kwargs: keyword arguments
         Additional keyword arguments are passed on to the function or constructor creating a plot.
+
+    The database query for the block visits is run in the background, so that other work can be done while waiting for
+    its results.
     """
 
-    def __init__(self, date, **kwargs):
+    def __init__(self, date, queries=None, **kwargs):
         self.date = date
         start = self.date - datetime.timedelta(days=300)
         end = self.date + datetime.timedelta(days=150)
 
         self.kwargs = kwargs
 
-        self.df = DateRangeQueries(start, end, db.engine).block_visits()
+        if queries is None:
+            queries = DateRangeQueries(start, end, db.engine)
+
+        self._df_future = EXECUTOR.submit(queries.block_visits)
+        self._dates = None
+        self._counts = None
+
+    @property
+    def df(self):
+        """The block visit data.
+
+        Accessing this property blocks until the database query has finished.
+        """
+
+        return self._df_future.result()
 
     def last_night_plot(self):
         """Dial plot displaying the number of block visits for the date preceding `self.date`.
@@ -39,7 +59,7 @@ class BlockVisitPlots:
             Plot for last night's number of block visits.
         """
 
-        block_visits = value_last_night(df=self.df, date=self.date, date_column='Date', value_column='BlockCount')
+        block_visits = self._block_visits(days=1)
         return DialPlot(values=[block_visits],
                         label_values=range(0, 13),
                         dial_color_func=lambda d: '#7f7f7f',
@@ -55,7 +75,7 @@ class BlockVisitPlots:
             Plot displaying the number of block visits for the last seven days.
         """
 
-        block_visits = value_last_week(df=self.df, date=self.date, date_column='Date', value_column='BlockCount')
+        block_visits = self._block_visits(days=7)
         return DialPlot(values=[block_visits],
                         label_values=range(0, 71, 10),
                         dial_color_func=lambda d: '#7f7f7f',
@@ -121,3 +141,28 @@ class BlockVisitPlots:
                                 y_range=Range1d(start=0, end=300),
                                 trend_func=trend_func,
                                 **self.kwargs)
+
+    def _block_visits(self, days):
+        """Number of block visits in the `days` days leading up to but excluding `self.date`.
+
+        The dates and block counts are extracted from the data frame as NumPy arrays when this method is called for the
+        first time, and these arrays are filtered directly.
+
+        Params:
+        -------
+        days : int
+            Number of days.
+
+        Returns:
+        --------
+        int
+            The number of block visits.
+        """
+
+        if self._dates is None:
+            self._dates = to_date_values(self.df, 'Date')
+            self._counts = self.df['BlockCount'].values
+
+        end = np.datetime64(self.date, 'D')
+        mask = (self._dates >= end - np.timedelta64(days, 'D')) & (self._dates < end)
+        return int(self._counts[mask].sum())
@@ -1,16 +1,21 @@
 import datetime
 import functools
 
-import numpy as np
+import pandas as pd
 
 from bokeh.models import Range1d
 from bokeh.models.formatters import PrintfTickFormatter
 from app import db
 from app.plot.plot import DialPlot
 from app.plot.queries import DateRangeQueries
-from app.plot.util import bin_by_semester, daily_bar_plot, day_range, day_running_average, \
-    good_mediocre_bad_color_func, monthly_bar_plot, month_range, month_running_average, \
-    required_for_semester_average, semester, value_last_night, value_last_week
+from app.plot.util import add_night_length_percentage, bin_by_semester, daily_bar_plot, day_range, \
+    day_running_average, good_mediocre_bad_color_func, monthly_bar_plot, month_range, month_running_average, \
+    percentage, required_for_semester_average, semester, to_date_values, values_last_night, values_last_week
+
+# the dial settings are the same for all dial plots and thus are created only once
+_DIAL_COLOR_FUNC = good_mediocre_bad_color_func(good_limit=13, bad_limit=18)
+_DIAL_LABEL_VALUES = (0, 5, 13, 18) + tuple(range(30, 101, 10))
+_MONTHLY_POST_BINNING_FUNC = functools.partial(add_night_length_percentage, time_column='EngineeringTime')
 
 
 class EngineeringTimePlots:
@@ -20,18 +25,26 @@ class EngineeringTimePlots:
     -------
     date : datetime.date
         The date for which to generate the plots.
+    queries : app.plot.queries.DateRangeQueries, optional
+        Queries to use for obtaining the data. Their date range must include the 300 days before and the 150 days after
+        `date`. By default new queries are created.
     **kwargs: keyword arguments
         Additional keyword arguments are passed on to the function or constructor creating a plot.
     """
 
-    def __init__(self, date, **kwargs):
+    def __init__(self, date, queries=None, **kwargs):
         self.date = date
         start = self.date - datetime.timedelta(days=300)
         end = self.date + datetime.timedelta(days=150)
 
         self.kwargs = kwargs
 
-        self.df = DateRangeQueries(start, end, db.engine).time_breakdown()[['Date', 'NightLength', 'EngineeringTime']]
+        if queries is None:
+            queries = DateRangeQueries(start, end, db.engine)
+
+        self.df = queries.time_breakdown()[['Date', 'NightLength', 'EngineeringTime']]
+
+        self._dates = to_date_values(self.df, 'Date')
 
     def last_night_plot(self):
         """Dial plot displaying the engineering time for the date preceding `self.date`.
@@ -45,18 +58,16 @@ class EngineeringTimePlots:
             Plot displaying the engineering time for last night.
         """
 
-        engineering_time = value_last_night(df=self.df,
-                                            date=self.date,
-                                            date_column='Date',
-                                            value_column='EngineeringTime')
-        night_length = value_last_night(df=self.df, date=self.date, date_column='Date', value_column='NightLength')
+        engineering_time, night_length = values_last_night(df=self.df,
+                                                           date=self.date,
+                                                           date_column='Date',
+                                                           value_columns=['EngineeringTime', 'NightLength'],
+                                                           date_values=self._dates)
         engineering_time_percentage = 100 * engineering_time / night_length
 
-        dial_color_func = good_mediocre_bad_color_func(good_limit=13, bad_limit=18)
-
         return DialPlot(values=[engineering_time_percentage],
-                        label_values=[0, 5, 13, 18] + [v for v in range(30, 101, 10)],
-                        dial_color_func=dial_color_func,
+                        label_values=_DIAL_LABEL_VALUES,
+                        dial_color_func=_DIAL_COLOR_FUNC,
                         display_values=['{:.1f}%'.format(engineering_time_percentage),
                                         '{:d}m'.format(int(engineering_time / 60))],
                         **self.kwargs)
@@ -73,15 +84,16 @@ class EngineeringTimePlots:
             Plot displaying the engineering time for the last seven days.
         """
 
-        engineering_time = value_last_week(df=self.df, date=self.date, date_column='Date', value_column='EngineeringTime')
-        night_length = value_last_week(df=self.df, date=self.date, date_column='Date', value_column='NightLength')
+        engineering_time, night_length = values_last_week(df=self.df,
+                                                          date=self.date,
+                                                          date_column='Date',
+                                                          value_columns=['EngineeringTime', 'NightLength'],
+                                                          date_values=self._dates)
         engineering_time_percentage = 100 * engineering_time / night_length
 
-        dial_color_func = good_mediocre_bad_color_func(good_limit=13, bad_limit=18)
-
         return DialPlot(values=[engineering_time_percentage],
-                        label_values=[0, 5, 13, 18] + [v for v in range(30, 101, 10)],
-                        dial_color_func=dial_color_func,
+                        label_values=_DIAL_LABEL_VALUES,
+                        dial_color_func=_DIAL_COLOR_FUNC,
                         display_values=['{:.1f}%'.format(engineering_time_percentage),
                                         '{:d}m'.format(int(engineering_time / 60))],
                         **self.kwargs)
@@ -107,9 +119,11 @@ class EngineeringTimePlots:
         start_date, end_date = day_range(self.date, days)
         trend_func = functools.partial(day_running_average, ignore_missing_values=False)
 
-        df = self.df.copy()
-        df['EngineeringTimePercentage'] = 100 * np.divide(df.EngineeringTime, df.NightLength)
-        df['EngineeringTime'] /= 60
+        # only the columns needed for the plot are included, so that the original data needn't be copied
+        engineering_time = self.df.EngineeringTime.values
+        df = pd.DataFrame(dict(Date=self.df.Date.values,
+                               EngineeringTime=engineering_time / 60,
+                               EngineeringTimePercentage=percentage(engineering_time, self.df.NightLength.values)))
 
         return daily_bar_plot(df=df,
                               start_date=start_date,
@@ -142,10 +156,6 @@ class EngineeringTimePlots:
         start_date, end_date = month_range(self.date, months)
         trend_func = functools.partial(month_running_average, ignore_missing_values=False)
 
-        def post_binning_func(df):
-            df['EngineeringTimePercentage'] = 100 * np.divide(df.EngineeringTime, df.NightLength)
-            df.EngineeringTime /= 3600
-
         return monthly_bar_plot(df=self.df,
                                 start_date=start_date,
                                 end_date=end_date,
@@ -156,7 +166,7 @@ class EngineeringTimePlots:
                                 y_formatters=[PrintfTickFormatter(format='%.0fh'),
                                               PrintfTickFormatter(format='%.0f%%')],
                                 trend_func=trend_func,
-                                post_binning_func=post_binning_func,
+                                post_binning_func=_MONTHLY_POST_BINNING_FUNC,
                                 **self.kwargs)
 
     def semester_to_date_plot(self):
@@ -178,23 +188,25 @@ class EngineeringTimePlots:
         """
 
         sem = semester(self.date)
-        binned_df = bin_by_semester(df=self.df, cutoff_date=self.date, date_column='Date', semester_column='Semester')
-        current_semester = binned_df[binned_df.Semester == sem]
+        binned_df = bin_by_semester(df=self.df,
+                                    cutoff_date=self.date,
+                                    date_column='Date',
+                                    semester_column='Semester',
+                                    date_values=self._dates)
         target_percentage = 5
-        if len(current_semester):
-            engineering_time_percentage = 100 * current_semester.EngineeringTime[0] / current_semester.NightLength[0]
+        if sem in binned_df.index:
+            row = binned_df.loc[sem]
+            engineering_time_percentage = 100 * row.EngineeringTime / row.NightLength
             required_percentage = required_for_semester_average(self.date, engineering_time_percentage, target_percentage)
-            engineering_time = current_semester.EngineeringTime[0] / 3600
+            engineering_time = row.EngineeringTime / 3600
         else:
             engineering_time_percentage = 0
             required_percentage = target_percentage
             engineering_time = 0
 
-        dial_color_func = good_mediocre_bad_color_func(good_limit=13, bad_limit=18)
-
         return DialPlot(values=[engineering_time_percentage, required_percentage],
-                        label_values=[0, 5, 13, 18] + [v for v in range(30, 101, 10)],
-                        dial_color_func=dial_color_func,
+                        label_values=_DIAL_LABEL_VALUES,
+                        dial_color_func=_DIAL_COLOR_FUNC,
                         display_values=['{:.1f}%'.format(engineering_time_percentage),
                                         '{:.1f}h'.format(engineering_time)],
                         **self.kwargs)
@@ -1,5 +1,7 @@
 import colorsys
 import datetime
+import threading
+import time
 import numpy as np
 import pandas as pd
 
@@ -8,10 +10,35 @@ from bokeh.models import ColumnDataSource, DataRange1d
 from bokeh.models.formatters import DatetimeTickFormatter
 from bokeh.models.widgets import DataTable, DateFormatter, TableColumn
 from bokeh.plotting import Figure
+from sqlalchemy import text
 
 from app import db
 from app.plot.plot import Plot
 
+_INSERT_RECOATING_SQL = text("""INSERT INTO MirrorRecoating (ReplacementDate, SegmentPosition)
+                                VALUES (:replacement_date, :segment_position)
+                                ON DUPLICATE KEY UPDATE SegmentPosition=SegmentPosition""")
+
+# the latest recoating date for each segment position, reloaded from the database after
+# _LATEST_RECOATING_DATES_TTL seconds
+_LATEST_RECOATING_DATES_TTL = 300
+_latest_recoating_dates = {}
+_latest_recoating_dates_loaded = {'time': None}
+_latest_recoating_dates_lock = threading.RLock()
+
+# offsets of a mirror segment's corners relative to its centre
+_SEGMENT_CORNER_ANGLES = np.radians(np.arange(0, 301, 60))
+_SEGMENT_CORNER_DX = 0.45 * np.cos(_SEGMENT_CORNER_ANGLES)
+_SEGMENT_CORNER_DY = 0.45 * np.sin(_SEGMENT_CORNER_ANGLES)
+
+
+# The segment colours have a hue of 99 degrees and full saturation. For these, each RGB component is 2 * l * w for a
+# lightness l <= 0.5 and 2 * l * (1 - w) + 2 * w - 1 for l > 0.5, where w is the component for a lightness of 0.5.
+_SEGMENT_HUE_WEIGHTS = np.array(colorsys.hls_to_rgb(99 / 360, 0.5, 1))
+_SEGMENT_DARK_SLOPE = 2 * _SEGMENT_HUE_WEIGHTS
+_SEGMENT_LIGHT_SLOPE = 2 * (1 - _SEGMENT_HUE_WEIGHTS)
+_SEGMENT_LIGHT_INTERCEPT = 2 * _SEGMENT_HUE_WEIGHTS - 1
+
 
 def update_database(excel_spreadsheet):
     """Update the mirror recoating data in the database.
@@ -44,14 +71,74 @@ def update_database(excel_spreadsheet):
     """
 
     data = _read_recoating_data(excel_spreadsheet)
-    values = ["(DATE('{replacement_date}'), {segment_position:d})"
-                .format(replacement_date=row[1].ReplacementDate.strftime('%Y-%m-%d'),
-                        segment_position=int(round(row[1].SegmentPosition)))
-              for row in data.iterrows()]
-    values = ','.join(values)
-    query = '''INSERT INTO MirrorRecoating (ReplacementDate, SegmentPosition) VALUES {values}
-                      ON DUPLICATE KEY UPDATE SegmentPosition=SegmentPosition'''.format(values=values)
-    db.engine.execute(query)
+    if len(data) == 0:
+        return
+
+    params = [dict(replacement_date=replacement_date, segment_position=segment_position)
+              for replacement_date, segment_position in zip(data.ReplacementDate.dt.date,
+                                                            data.SegmentPosition.round().astype(int).tolist())]
+    db.engine.execute(_INSERT_RECOATING_SQL, params)
+
+    _update_latest_recoatings(params)
+
+
+def _latest_recoatings():
+    """The latest recoating date for each segment position in the database.
+
+    The dates are kept in memory. They are loaded from the database when this function is called for the first time,
+    and they are reloaded if they have been loaded more than `_LATEST_RECOATING_DATES_TTL` seconds (five minutes) ago.
+    `update_database` updates them immediately.
+
+    Note that the dates are kept per process. If the site is served by several worker processes, an update of the
+    database is only seen immediately by the process handling the upload; the other processes only see it once they
+    reload the dates, i.e. after at most five minutes.
+
+    Returns:
+    --------
+    pandas.DataFrame
+        Data frame with the recoating dates and segment positions in columns named 'ReplacementDate' and
+        'SegmentPosition', sorted by date and segment position.
+    """
+
+    now = time.monotonic()
+    with _latest_recoating_dates_lock:
+        loaded = _latest_recoating_dates_loaded['time']
+        if loaded is None or now - loaded > _LATEST_RECOATING_DATES_TTL:
+            query = "SELECT MAX(ReplacementDate) AS ReplacementDate, SegmentPosition" \
+                    "       FROM MirrorRecoating" \
+                    "       GROUP BY SegmentPosition"
+            df = pd.read_sql(query, db.engine)
+            _latest_recoating_dates.clear()
+            _latest_recoating_dates.update(zip(df.SegmentPosition.tolist(), df.ReplacementDate.tolist()))
+            _latest_recoating_dates_loaded['time'] = now
+        segment_positions = list(_latest_recoating_dates.keys())
+        replacement_dates = list(_latest_recoating_dates.values())
+
+    df = pd.DataFrame(dict(ReplacementDate=replacement_dates, SegmentPosition=segment_positions),
+                      columns=['ReplacementDate', 'SegmentPosition'])
+    return df.sort_values(by=['ReplacementDate', 'SegmentPosition']).reset_index(drop=True)
+
+
+def _update_latest_recoatings(recoatings):
+    """Update the in-memory latest recoating dates with newly inserted recoatings.
+
+    Nothing is done if the dates haven't been loaded yet, as they will then be loaded from the (updated) database.
+
+    Params:
+    -------
+    recoatings : list of dict
+        The recoatings, as dictionaries with the keys 'replacement_date' and 'segment_position'.
+    """
+
+    with _latest_recoating_dates_lock:
+        if _latest_recoating_dates_loaded['time'] is None:
+            return
+        for recoating in recoatings:
+            segment_position = recoating['segment_position']
+            replacement_date = recoating['replacement_date']
+            latest = _latest_recoating_dates.get(segment_position)
+            if latest is None or replacement_date > latest:
+                _latest_recoating_dates[segment_position] = replacement_date
 
 
 def _read_recoating_data(excel_spreadsheet):
@@ -77,16 +164,9 @@ def _read_recoating_data(excel_spreadsheet):
     data = data[['ReplacementDate', 'SegmentPosition']]
 
     # add missing dates
-    replacement_dates = []
-    segment_positions = []
-    for row in data.iterrows():
-        date = row[1].ReplacementDate
-        if pd.isnull(date):
-            date = replacement_dates[-1]
-        replacement_dates.append(date)
-        segment_positions.append(row[1].SegmentPosition)
+    data = data.assign(ReplacementDate=pd.to_datetime(data.ReplacementDate).ffill())
 
-    return pd.DataFrame(dict(ReplacementDate=replacement_dates, SegmentPosition=segment_positions))
+    return data.reset_index(drop=True)
 
 
 class MirrorRecoatingPlot(Plot):
@@ -104,8 +184,10 @@ class MirrorRecoatingPlot(Plot):
 
         self.now = now
 
-        self.mirror_positions = \
-            [None, (0, 0.0), (0, 1.0), (1, 0.5), (1, -0.5), (0, -1.0), (-1, -0.5), (-1, 0.5), (0, 2.0), (1, 1.5),
+        # the positions of the segments' centres, with a dummy row for the (non-existing) segment 0
+        self.mirror_positions = np.array(
+            [(np.nan, np.nan),
+             (0, 0.0), (0, 1.0), (1, 0.5), (1, -0.5), (0, -1.0), (-1, -0.5), (-1, 0.5), (0, 2.0), (1, 1.5),
              (2, 1.0), (2, 0.0), (2, -1.0), (1, -1.5), (0, -2.0), (-1, -1.5), (-2, -1.0), (-2, 0.0), (-2, 1.0),
              (-1, 1.5), (0, 3.0), (1, 2.5), (2, 2.0), (3, 1.5), (3, 0.5), (3, -0.5), (3, -1.5), (2, -2.0), (1, -2.5),
              (0, -3.0), (-1, -2.5), (-2, -2.0), (-3, -1.5), (-3, -0.5), (-3, 0.5), (-3, 1.5), (-2, 2.0), (-1, 2.5),
@@ -114,7 +196,7 @@ class MirrorRecoatingPlot(Plot):
              (-4, 1.0), (-4, 2.0), (-3, 2.5),  (-2, 3.0), (-1, 3.5), (0, 5.0), (1, 4.5), (2, 4.0), (3, 3.5), (4, 3.0),
              (5, 2.5), (5, 1.5), (5, 0.5), (5, -0.5), (5, -1.5), (5, -2.5), (4, -3.0), (3, -3.5), (2, -4.0), (1, -4.5),
              (0, -5.0), (-1, -4.5), (-2, -4.0), (-3, -3.5), (-4, -3.0), (-5, -2.5), (-5, -1.5), (-5, -0.5), (-5, 0.5),
-             (-5, 1.5), (-5, 2.5), (-4, 3.0), (-3, 3.5), (-2, 4.0), (-1, 4.5)]
+             (-5, 1.5), (-5, 2.5), (-4, 3.0), (-3, 3.5), (-2, 4.0), (-1, 4.5)])
 
         # the time after which a segment needs recoating (in days)
         self.RECOATING_PERIOD = 365
@@ -123,16 +205,13 @@ class MirrorRecoatingPlot(Plot):
 
     def _init_plot(self):
         # get recoating data
-        query = "SELECT MAX(ReplacementDate) AS ReplacementDate, SegmentPosition" \
-                "       FROM MirrorRecoating" \
-                "       GROUP BY SegmentPosition ORDER BY ReplacementDate, SegmentPosition"
-        df = pd.read_sql(query, db.engine)
+        df = _latest_recoatings()
 
         # add missing segment positions
-        missing_positions = [p for p in range(1, 92) if p not in df.SegmentPosition.values]
-        df_missing = pd.DataFrame(dict(SegmentPosition=missing_positions,
-                                       ReplacementDate=len(missing_positions) * [datetime.date(1970, 1, 1)]))
-        df = df.append(df_missing, ignore_index=True)
+        missing_positions = sorted(set(range(1, 92)) - set(df.SegmentPosition.astype(int).tolist()))
+        df_missing = pd.DataFrame(dict(SegmentPosition=missing_positions, ReplacementDate=datetime.date(1970, 1, 1)),
+                                  columns=['ReplacementDate', 'SegmentPosition'])
+        df = pd.concat([df, df_missing], ignore_index=True, copy=False)
 
         # sort by date (in descending order)
         df.sort_values(by='ReplacementDate', ascending=False, inplace=True)
@@ -140,20 +219,28 @@ class MirrorRecoatingPlot(Plot):
         # add cumulative number of replacements since one recoating period ago
         start = self.now - datetime.timedelta(self.RECOATING_PERIOD)
         recoatings = len(df[df.ReplacementDate >= start])
-        df['RecoatingsSinceYearStart'] = [max(recoatings - i, 0) for i in range(0, 91)]
+        df['RecoatingsSinceYearStart'] = np.clip(recoatings - np.arange(len(df)), 0, None)
 
         # add days since recoating
-        df['DaysSinceReplacement'] = [(self.now - d).days for d in df.ReplacementDate.values]
+        replacement_dates = df.ReplacementDate.values.astype('datetime64[D]')
+        df['DaysSinceReplacement'] = (np.datetime64(self.now, 'D') - replacement_dates).astype(int)
 
         # add segment position coordinates
-        df['SegmentPositionX'] = [self.mirror_positions[m][0] for m in df.SegmentPosition]
-        df['SegmentPositionY'] = [self.mirror_positions[m][1] for m in df.SegmentPosition]
-        df['SegmentPositionCornerXs'] = [self._segment_corners(m)[0] for m in df.SegmentPosition]
-        df['SegmentPositionCornerYs'] = [self._segment_corners(m)[1] for m in df.SegmentPosition]
+        segments = df.SegmentPosition.values.astype(int)
+        positions = self.mirror_positions[segments]
+        df['SegmentPositionX'] = positions[:, 0]
+        df['SegmentPositionY'] = positions[:, 1]
 
         # create data source
         source = ColumnDataSource(df)
 
+        # The corner coordinates are added to the data source as rows of the (N, 6) corner arrays. Pandas would try to
+        # turn such rows into a two-dimensional column, and converting them to lists would create a Python float for
+        # every corner.
+        corner_xs, corner_ys = self._segment_corners(positions)
+        source.add(list(corner_xs), 'SegmentPositionCornerXs')
+        source.add(list(corner_ys), 'SegmentPositionCornerYs')
+
         table = self._table(source)
         replacement_plot = self._replacement_plot(source)
         segment_plot = self._segment_plot(source)
@@ -200,32 +287,8 @@ class MirrorRecoatingPlot(Plot):
             Plot showing the mirror segments.
         """
 
-        def segment_color(date):
-            """Fill colour of a mirror segment."""
-            days = (datetime.datetime.now().date() - date).days
-            days = min(days, self.RECOATING_PERIOD)
-            days = max(days, 0)
-
-            def hex_value(v):
-                """Convert integer into a hexadecimal string suitable for specifying an RGB value in a css rule."""
-                s = format(int(round(255 * v)), 'x')
-                if len(s) < 2:
-                    s = '0' + s
-                return s
-
-            # The colour ranges from dark green for recently recoated segments to white for segments which need to be
-            # recoated.
-            h = 99
-            s = 100
-            l = 33 + 67 * days / self.RECOATING_PERIOD
-            rgb = colorsys.hls_to_rgb(h / 360, l / 100, s / 100)
-
-            return '#{r}{g}{b}'.format(r=hex_value(rgb[0]),
-                                       g=hex_value(rgb[1]),
-                                       b=hex_value(rgb[2]))
-
         plot = Figure(tools='tap', toolbar_location=None)
-        colors = [segment_color(d) for d in source.data['ReplacementDate']]
+        colors = self._segment_colors(source.data['ReplacementDate'])
         plot.patches(xs='SegmentPositionCornerXs',
                      ys='SegmentPositionCornerYs',
                      source=source,
@@ -249,35 +312,64 @@ class MirrorRecoatingPlot(Plot):
 
         return plot
 
-    def _segment_corners(self, m):
-        """The coordinates of a mirror segment's corners.
+    def _segment_colors(self, dates):
+        """Fill colours of mirror segments.
+
+        The colour ranges from dark green for recently recoated segments to white for segments which need to be
+        recoated. As hue and saturation are the same for all segments, the HLS to RGB conversion reduces to piecewise
+        linear functions of the lightness, which are evaluated for all segments at once.
+
+        Params:
+        -------
+        dates: array-like of datetime.date
+            The dates when the segments were recoated.
+
+        Returns:
+        --------
+        list of str
+            The colours, as hexadecimal strings suitable for specifying an RGB value in a css rule.
+        """
+
+        today = np.datetime64(datetime.datetime.now().date(), 'D')
+        days = (today - np.asarray(dates).astype('datetime64[D]')).astype(int)
+        days = np.clip(days, 0, self.RECOATING_PERIOD)
+
+        l = (33 + 67 * days / self.RECOATING_PERIOD) / 100
+        l = l[:, np.newaxis]
+        rgb = np.where(l <= 0.5,
+                       l * _SEGMENT_DARK_SLOPE,
+                       l * _SEGMENT_LIGHT_SLOPE + _SEGMENT_LIGHT_INTERCEPT)
+
+        return ['#{:02x}{:02x}{:02x}'.format(*c) for c in np.round(255 * rgb).astype(int).tolist()]
+
+    @staticmethod
+    def _segment_corners(positions):
+        """The coordinates of mirror segments' corners.
 
         The centre of the central mirror has the coordinates (0, 0). The distance between centre and corners of the
         segment is 0.45. The distance between the centers of adjacent segments lying on the same horizontal or vertical
         line is 1. This means that the 91 segments in total cover a range from roughly -5 to 5 in both x and y
         direction.
 
-        The coordinates are returned as a tuple (xs, ys), where xs (ys) are the x (y) coordinates of the corners. These
-        coordinates can be used for Bokeh's Patch or Patches glyph.
+        The coordinates are returned as a tuple (xs, ys) of arrays of shape (N, 6), where N is the number of segments.
+        Row i of xs (ys) contains the x (y) coordinates of the corners of the i-th segment. The rows can be used for
+        Bokeh's Patch or Patches glyph.
 
         Params:
         -------
-        m: int
-            Number of the segment.
+        positions: numpy.ndarray
+            Array of shape (N, 2) with the x and y coordinates of the segments' centres.
 
         Returns:
         --------
-        tuple of lists
-            The x and y coordinates of the segment's corners.
+        tuple of numpy.ndarray
+            The x and y coordinates of the segments' corners.
 
         """
 
-        r = 0.45
-        angles = np.radians(np.arange(0, 301, 60))
-        offset = self.mirror_positions[m]
-        xs = offset[0] + r * np.cos(angles)
-        ys = offset[1] + r * np.sin(angles)
-        return xs.tolist(), ys.tolist()
+        xs = positions[:, 0:1] + _SEGMENT_CORNER_DX
+        ys = positions[:, 1:2] + _SEGMENT_CORNER_DY
+        return xs, ys
 
     def _replacement_plot(self, source):
         start = self.now - datetime.timedelta(days=self.RECOATING_PERIOD)
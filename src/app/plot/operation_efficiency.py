@@ -8,11 +8,48 @@ import pandas as pd
 
 from app import db
 from app.plot.plot import DialPlot
-from app.plot.queries import DateRangeQueries
-from app.plot.util import bin_by_semester, daily_bar_plot, day_range, day_running_average,\
+from app.plot.queries import DateRangeQueries, EXECUTOR
+from app.plot.util import daily_bar_plot, day_range, day_running_average,\
                           month_range, monthly_bar_plot, month_running_average,\
-                          good_mediocre_bad_color_func, semester, required_for_semester_average,\
-                          value_last_night, value_last_week
+                          good_mediocre_bad_color_func, percentage, semester_range, required_for_semester_average,\
+                          to_date_values, values_last_night, values_last_week
+
+# the dial colours are the same for all dial plots and thus are created only once
+_DIAL_COLOR_FUNC = good_mediocre_bad_color_func(good_limit=90, bad_limit=80)
+
+
+def _operation_efficiency_data(queries):
+    """Data frame of observation and science times, and the array of its dates.
+
+    Dates without any science time are omitted. The dates are also returned as an array for the date filters, as
+    created by `to_date_values`.
+
+    Params:
+    -------
+    queries : app.plot.queries.DateRangeQueries
+        Queries to use for obtaining the data.
+
+    Returns:
+    --------
+    tuple
+        The data frame and the array of dates.
+    """
+
+    # run the two (independent) queries concurrently
+    obs_time_future = EXECUTOR.submit(queries.observation_time)
+    df_time_breakdown = queries.time_breakdown()
+    df_obs_time = obs_time_future.result()
+
+    # only the science time is needed from the time breakdown
+    df = pd.merge(df_obs_time, df_time_breakdown[['Date', 'ScienceTime']], on=['Date'], how='outer')
+
+    # avoid NaN issues later on (missing science times needn't be filled, as they are filtered out below)
+    df['ObsTime'] = df.ObsTime.fillna(value=0)
+
+    # ignore values with no science time, and sort by date (as required for filtering by date with a binary search)
+    df = df[(df.ScienceTime > 0.0001).values].sort_values('Date')
+
+    return df, to_date_values(df, 'Date')
 
 
 class OperationEfficiencyPlots:
@@ -26,27 +63,24 @@ class OperationEfficiencyPlots:
     -------
     date : datetime.date
         Date for which the plots are generated.
+    queries : app.plot.queries.DateRangeQueries, optional
+        Queries to use for obtaining the data. Their date range must include the 300 days before and the 150 days after
+        `date`. By default new queries are created.
     **kwargs: keyword arguments
         Additional keyword arguments are passed on to the function or constructor creating a plot.
     """
 
-    def __init__(self, date, **kwargs):
+    def __init__(self, date, queries=None, **kwargs):
         self.date = date
         start = self.date - datetime.timedelta(days=300)
         end = self.date + datetime.timedelta(days=150)
 
         self.kwargs = kwargs
 
-        queries = DateRangeQueries(start, end, db.engine)
-        df_obs_time = queries.observation_time()
-        df_time_breakdown = queries.time_breakdown()
-        self.df = pd.merge(df_obs_time, df_time_breakdown, on=['Date'], how='outer')
-
-        # ignore values with no science time
-        self.df = self.df[self.df.ScienceTime > 0.0001]
+        if queries is None:
+            queries = DateRangeQueries(start, end, db.engine)
 
-        # avoid NaN issues later on
-        self.df.fillna(value=0, inplace=True)
+        self.df, self._dates = _operation_efficiency_data(queries)
 
     def last_night_plot(self):
         """Dial plot displaying the operation efficiency for last night, i.e. for the date preceding `self.date`.
@@ -57,15 +91,16 @@ class OperationEfficiencyPlots:
             Plot displaying the operation efficiency for last night.
         """
 
-        obs_time = value_last_night(df=self.df, date=self.date, date_column='Date', value_column='ObsTime')
-        science_time = value_last_night(df=self.df, date=self.date, date_column='Date', value_column='ScienceTime')
+        obs_time, science_time = values_last_night(df=self.df,
+                                                   date=self.date,
+                                                   date_column='Date',
+                                                   value_columns=['ObsTime', 'ScienceTime'],
+                                                   date_values=self._dates)
         operation_efficiency = self._observation_efficiency(obs_time, science_time)
 
-        dial_color_func = good_mediocre_bad_color_func(bad_limit=80, good_limit=90)
-
         return DialPlot(values=[operation_efficiency],
                         label_values=range(0, 151, 10),
-                        dial_color_func=dial_color_func,
+                        dial_color_func=_DIAL_COLOR_FUNC,
                         display_values=['{:.1f}%'.format(operation_efficiency)],
                         **self.kwargs)
 
@@ -78,15 +113,16 @@ class OperationEfficiencyPlots:
             Plot displaying the operation efficiency for the last seven days.
         """
 
-        obs_time = value_last_week(df=self.df, date=self.date, date_column='Date', value_column='ObsTime')
-        science_time = value_last_week(df=self.df, date=self.date, date_column='Date', value_column='ScienceTime')
+        obs_time, science_time = values_last_week(df=self.df,
+                                                  date=self.date,
+                                                  date_column='Date',
+                                                  value_columns=['ObsTime', 'ScienceTime'],
+                                                  date_values=self._dates)
         operation_efficiency = self._observation_efficiency(obs_time, science_time)
 
-        dial_color_func = good_mediocre_bad_color_func(bad_limit=80, good_limit=90)
-
         return DialPlot(values=[operation_efficiency],
                         label_values=range(0, 151, 10),
-                        dial_color_func=dial_color_func,
+                        dial_color_func=_DIAL_COLOR_FUNC,
                         display_values=['{:.1f}%'.format(operation_efficiency)],
                         **self.kwargs)
 
@@ -108,8 +144,9 @@ class OperationEfficiencyPlots:
             Plot of operation efficiency as a function of the day.
         """
 
-        df = self.df.copy()
-        df['OperationEfficiency'] = 100 * np.divide(df.ObsTime, df.ScienceTime)
+        # only the columns needed for the plot are included
+        df = pd.DataFrame(dict(Date=self.df.Date.values,
+                               OperationEfficiency=percentage(self.df.ObsTime.values, self.df.ScienceTime.values)))
 
         start_date, end_date = day_range(self.date, days)
         trend_func = functools.partial(day_running_average, ignore_missing_values=True)
@@ -145,9 +182,6 @@ class OperationEfficiencyPlots:
         start_date, end_date = month_range(self.date, months)
         trend_func = functools.partial(month_running_average, ignore_missing_values=False)
 
-        def post_binning_func(df):
-            df['OperationEfficiency'] = 100 * np.divide(df.ObsTime, df.ScienceTime)
-
         return monthly_bar_plot(df=self.df,
                                 start_date=start_date,
                                 end_date=end_date,
@@ -156,7 +190,7 @@ class OperationEfficiencyPlots:
                                 y_column='OperationEfficiency',
                                 y_range=Range1d(start=0, end=120),
                                 trend_func=trend_func,
-                                post_binning_func=post_binning_func,
+                                post_binning_func=self._monthly_post_binning,
                                 **self.kwargs)
 
     def semester_to_date_plot(self):
@@ -171,26 +205,38 @@ class OperationEfficiencyPlots:
             Plot of the operation efficiency for the semester to date.
         """
 
-        sem = semester(self.date)
-        binned_df = bin_by_semester(df=self.df, cutoff_date=self.date, date_column='Date', semester_column='Semester')
-        current_semester = binned_df[binned_df.Semester == sem]
-        if len(current_semester):
-            operation_efficiency = self._observation_efficiency(current_semester.ObsTime[0],
-                                                                current_semester.ScienceTime[0])
+        # only the current semester matters, so there is no need to bin by semester
+        semester_start = np.datetime64(semester_range(self.date)[0], 'D')
+        first, last = np.searchsorted(self._dates, [semester_start, np.datetime64(self.date, 'D')])
+        if last > first:
+            operation_efficiency = self._observation_efficiency(self.df.ObsTime.values[first:last].sum(),
+                                                                self.df.ScienceTime.values[first:last].sum())
         else:
             operation_efficiency = 0
 
-        dial_color_func = good_mediocre_bad_color_func(good_limit=90, bad_limit=80)
-
         required_operation_efficiency = required_for_semester_average(date=self.date,
                                                                       average=operation_efficiency,
                                                                       target_average=90)
 
         return DialPlot(values=[operation_efficiency, required_operation_efficiency],
                         label_values=range(0, 101, 10),
-                        dial_color_func=dial_color_func,
+                        dial_color_func=_DIAL_COLOR_FUNC,
                         display_values=['{:.1f}%'.format(operation_efficiency)],
                         **self.kwargs)
 
+    @staticmethod
+    def _monthly_post_binning(df):
+        """Add the operation efficiency to monthly binned data.
+
+        The operation efficiency is computed from the underlying NumPy arrays, with a single array allocation.
+
+        Params:
+        -------
+        df : pandas.DataFrame
+            Binned data. This data frame is modified in place.
+        """
+
+        df['OperationEfficiency'] = percentage(df.ObsTime.values, df.ScienceTime.values)
+
     def _observation_efficiency(self, obs_time, science_time):
         return 100 * obs_time / science_time if science_time else np.NaN
@@ -1,10 +1,10 @@
-import datetime
+import calendar
+import functools
 import math
 import numpy as np
 
-import pytz
 from bokeh.embed import components
-from bokeh.models import ColumnDataSource, FixedTicker, Quad, Range1d
+from bokeh.models import ColumnDataSource, FixedTicker, Range1d
 from bokeh.models.axes import LinearAxis
 from bokeh.plotting import figure
 
@@ -26,6 +26,7 @@ class Plot:
 
     def __init__(self, **kwargs):
         self.plot = figure(**kwargs)
+        self._html = None
 
     def to_html(self):
         """HTML for displaying the plot.
@@ -45,10 +46,15 @@ class Plot:
         Again, x.y.z denotes the Bokeh version.
 
         A class extending this one must ensure that its constructor adds all the plot content to `self.plot`.
+
+        The HTML is generated when this method is called for the first time, and the same HTML is returned for all
+        subsequent calls. So any changes made to `self.plot` after the first call are ignored.
         """
 
-        div, script = components(self.plot)
-        return '<div class="printable plot">' + script + div + '</div>'
+        if self._html is None:
+            div, script = components(self.plot)
+            self._html = '<div class="printable plot">' + script + div + '</div>'
+        return self._html
 
     def __str__(self):
         return self.to_html()
@@ -125,25 +131,25 @@ class TimeBarPlot(Plot):
             bar_width = 0.6 * dx
         offset = int(round(offset))
         bar_width = int(round(bar_width))
-        x = np.array([self._milliseconds_timestamp(d) for d in df['x']])
+        x = self._milliseconds_timestamps(df['x'].values)
         x1 = x - offset - bar_width
         x2 = x - offset
-        y1 = np.zeros(len(x1))
-        y2 = df['y']
-        source_content = dict(x=x, x1=x1, y1=y1, x2=x2, y2=y2)
+        y2 = df['y'].values.astype(np.float64, copy=False)
+        source_content = dict(x=x, x1=x1, x2=x2, y2=y2)
         if alt_y_range:
             alt_x1 = x + offset
             alt_x2 = x + offset + bar_width
-            alt_y1 = np.zeros(len(alt_x1))
-            alt_y2 = df['alt_y']
+            alt_y2 = df['alt_y'].values.astype(np.float64, copy=False)
             source_content['alt_x1'] = alt_x1
             source_content['alt_x2'] = alt_x2
-            source_content['alt_y1'] = alt_y1
             source_content['alt_y2'] = alt_y2
         self.source = ColumnDataSource(source_content)
         self.dx = dx
-        self.x_range = Range1d(start=self._milliseconds_timestamp(x_range.start) - dx // 2,
-                               end=self._milliseconds_timestamp(x_range.end) + dx // 2)
+        half_dx = dx // 2
+        self.x_range = Range1d(start=self._milliseconds_timestamp(x_range.start) - half_dx,
+                               end=self._milliseconds_timestamp(x_range.end) + half_dx)
+        self.stripe_centers = self._stripe_centers(self.x_range, dx)
+        self.ticks = self._ticks(self.x_range, dx)
         self.y_range = y_range
         self.alt_y_range = alt_y_range
         self.date_formatter = date_formatter
@@ -154,9 +160,12 @@ class TimeBarPlot(Plot):
         self._init_plot()
 
     @staticmethod
+    @functools.lru_cache(maxsize=1024)
     def _milliseconds_timestamp(d):
         """Milliseconds since the Unix epoch.
 
+        The result is cached, as plots on the same page tend to share their date ranges.
+
         Params:
         -------
         d: datetime.datetime or datetime.date
@@ -166,11 +175,72 @@ class TimeBarPlot(Plot):
         --------
         int: The number of milliseconds between the Unix epoch and `d`.
         """
-        if isinstance(d, datetime.datetime):
-            d = datetime.datetime(d.year, d.month, d.day, d.hour, d.minute, d.second, 0, tzinfo=pytz.UTC)
-        else:
-            d = datetime.datetime(d.year, d.month, d.day, 0, 0, 0, 0, tzinfo=pytz.UTC)
-        return int(round(d.timestamp() * 1000))
+        # the time tuple of a date is for midnight, and it ignores microseconds and time zones
+        return 1000 * calendar.timegm(d.timetuple())
+
+    @staticmethod
+    def _milliseconds_timestamps(dates):
+        """Milliseconds since the Unix epoch for an array of dates.
+
+        This is a vectorized version of `_milliseconds_timestamp`, i.e. datetimes are treated as UTC times and their
+        microseconds are ignored.
+
+        Params:
+        -------
+        dates: numpy.ndarray
+            Array of dates, as `datetime.datetime` or `datetime.date` objects or as `numpy.datetime64` values.
+
+        Returns:
+        --------
+        numpy.ndarray: The number of milliseconds between the Unix epoch and the dates, as 64 bit integers.
+        """
+        return dates.astype('datetime64[s]').astype(np.int64) * 1000
+
+    @staticmethod
+    def _stripe_centers(x_range, dx):
+        """Positions of the centres of the background stripes.
+
+        The stripes start at the first date of the plotted range and are `dx` apart. There is no stripe beyond the last
+        date of the range.
+
+        Params:
+        -------
+        x_range: bokeh.models.Range1d
+            Range of the date axis, in milliseconds since the Unix epoch.
+        dx: int
+            The time difference between subsequent dates, in milliseconds.
+
+        Returns:
+        --------
+        numpy.ndarray: The stripe centres, in milliseconds since the Unix epoch.
+        """
+        x_min = x_range.start + dx // 2
+        x_max = x_range.end - dx // 2
+        stripe_count = 1 + (x_max - x_min) // dx
+        return x_min + dx * np.arange(stripe_count, dtype=np.int64)
+
+    @staticmethod
+    def _ticks(x_range, dx):
+        """Positions of the date axis ticks.
+
+        The ticks are evenly spaced between the first and last date of the plotted range, with a spacing as close to
+        `dx` as possible.
+
+        Params:
+        -------
+        x_range: bokeh.models.Range1d
+            Range of the date axis, in milliseconds since the Unix epoch.
+        dx: int
+            The time difference between subsequent dates, in milliseconds.
+
+        Returns:
+        --------
+        numpy.ndarray: The tick positions, in milliseconds since the Unix epoch.
+        """
+        x_min = x_range.start + dx // 2
+        x_max = x_range.end - dx // 2
+        tick_count = 1 + int(round((x_max - x_min) / dx))
+        return np.linspace(x_min, x_max, tick_count)
 
     @staticmethod
     def _total_milliseconds(dt):
@@ -209,33 +279,25 @@ class TimeBarPlot(Plot):
             p.extra_y_ranges = {'alt_y': self.alt_y_range}
 
         # background stripes with alternating color
-        def add_background_stripe(x, index):
-            if divmod(index, 2)[1] == 1:
-                color = self.ODD_BOX_ANNOTATION_COLOR
-            else:
-                color = self.EVEN_BOX_ANNOTATION_COLOR
-            q = Quad(left=(x - self.dx // 2),
-                     bottom=0,
-                     right=(x + self.dx // 2),
-                     top=self.plot.y_range.end,
-                     line_color=None,
-                     fill_color=color,
-                     fill_alpha=0.2)
-            self.plot.add_glyph(q)
-
-        # add background stripes
-        x_min = self.x_range.start + self.dx // 2
-        x_max = self.x_range.end - self.dx // 2
-        i = 0
-        while x_min + i * self.dx <= x_max:
-            x = x_min + i * self.dx
-            add_background_stripe(x, i)
-            i += 1
+        stripe_colors = np.where(np.arange(len(self.stripe_centers)) & 1,
+                                 self.ODD_BOX_ANNOTATION_COLOR,
+                                 self.EVEN_BOX_ANNOTATION_COLOR)
+        stripes = ColumnDataSource(dict(left=self.stripe_centers - self.dx // 2,
+                                        right=self.stripe_centers + self.dx // 2,
+                                        fill_color=stripe_colors.tolist()))
+        p.quad(source=stripes,
+               left='left',
+               bottom=0,
+               right='right',
+               top=p.y_range.end,
+               line_color=None,
+               fill_color='fill_color',
+               fill_alpha=0.2)
 
         # bars for primary values
         p.quad(source=self.source,
                left='x1',
-               bottom='y1',
+               bottom=0,
                right='x2',
                top='y2',
                fill_color=self.PRIMARY_COLOR,
@@ -246,7 +308,7 @@ class TimeBarPlot(Plot):
             p.quad(source=self.source,
                    y_range_name='alt_y',
                    left='alt_x1',
-                   bottom='alt_y1',
+                   bottom=0,
                    right='alt_x2',
                    top='alt_y2',
                    fill_color=self.SECONDARY_COLOR,
@@ -260,8 +322,7 @@ class TimeBarPlot(Plot):
             p.add_layout(LinearAxis(y_range_name='alt_y'), 'right')
 
         # date axis labels
-        tick_count = 1 + int(round((x_max - x_min) / self.dx))
-        p.xaxis.ticker = FixedTicker(ticks=np.linspace(x_min, x_max, tick_count))
+        p.xaxis.ticker = FixedTicker(ticks=self.ticks)
         p.xaxis.formatter = self.date_formatter
         p.xaxis.major_tick_line_color = None
         p.xaxis.major_tick_out = 0
@@ -333,10 +394,13 @@ class DialPlot(Plot):
         angle_range = max_angle - min_angle
         angle_func = lambda x : max_angle - ((x - min_value) / value_range) * angle_range
 
-        start_angle = [angle_func(self.label_values[i]) for i in range(0, len(self.label_values) - 1)]
-        end_angle = [angle_func(self.label_values[i]) for i in range(1, len(self.label_values))]
-        fill_color = [self.dial_color_func(0.5 * (self.label_values[i] + self.label_values[i + 1]))
-                      for i in range(0, len(self.label_values) - 1)]
+        # angles of all the labels, which are the boundaries of the dial wedges
+        label_values = np.asarray(self.label_values, dtype=float)
+        label_angles = angle_func(label_values)
+
+        start_angle = label_angles[:-1].tolist()
+        end_angle = label_angles[1:].tolist()
+        fill_color = [self.dial_color_func(v) for v in (0.5 * (label_values[:-1] + label_values[1:])).tolist()]
 
         # angular segment underneath the value display
         start_angle.append(min_angle)
@@ -358,11 +422,12 @@ class DialPlot(Plot):
 
         # add labels
         label_radius = 1.15
-        label_x = [label_radius * math.cos(angle_func(v)) for v in self.label_values]
-        label_y = [label_radius * math.sin(angle_func(v)) for v in self.label_values]
+        label_x = (label_radius * np.cos(label_angles)).tolist()
+        label_y = (label_radius * np.sin(label_angles)).tolist()
+        label_texts = [str(v) for v in self.label_values]
         self.plot.text(x=label_x,
                        y=label_y,
-                       text=self.label_values,
+                       text=label_texts,
                        text_align='center',
                        text_baseline='middle',
                        text_font_style='normal')
@@ -424,12 +489,11 @@ class DialPlot(Plot):
                             radius=hand_radius,
                             color=color)
 
-            D = np.array([math.cos(angle), -math.sin(angle), math.sin(angle), math.cos(angle)]).reshape((2, 2))
-            p1 = D.dot(np.array([0, hand_radius]).transpose())
-            p2 = D.dot(np.array([0.8, 0]).transpose())
-            p3 = D.dot(np.array([0, -hand_radius]).transpose())
-            self.plot.patch(x=[p1[0], p2[0], p3[0]],
-                            y=[p1[1], p2[1], p3[1]],
+            # the triangle corners (0, hand_radius), (0.8, 0) and (0, -hand_radius), rotated by the angle
+            cos_angle = math.cos(angle)
+            sin_angle = math.sin(angle)
+            self.plot.patch(x=[-hand_radius * sin_angle, 0.8 * cos_angle, hand_radius * sin_angle],
+                            y=[hand_radius * cos_angle, 0.8 * sin_angle, -hand_radius * cos_angle],
                             color=color)
 
         # draw hand for primary and (if applicable) secondary value
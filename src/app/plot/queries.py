@@ -1,8 +1,160 @@
 import datetime
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
+from cachetools import TTLCache
+from sqlalchemy import text
 
 from app.util import SCIENCE_PROPOSAL_TYPES
 
+# executor for running queries in the background while a request is doing other work
+EXECUTOR = ThreadPoolExecutor(max_workers=4)
+
+
+def _in_clause(name, values):
+    """SQL fragment and parameters for an IN clause with a bound parameter for each value.
+
+    Params:
+    -------
+    name : str
+        Prefix for the parameter names.
+    values : sequence
+        Values for the IN clause.
+
+    Returns:
+    --------
+    tuple
+        The SQL fragment (such as `(:name_0, :name_1)`) and the dictionary of parameter values.
+
+    Examples:
+    ---------
+    >>> fragment, params = _in_clause('n', [3, 7])
+    >>> fragment
+    '(:n_0, :n_1)'
+    >>> sorted(params.items())
+    [('n_0', 3), ('n_1', 7)]
+    """
+
+    names = ['{name}_{index}'.format(name=name, index=i) for i in range(len(values))]
+    fragment = '(' + ', '.join(':' + n for n in names) + ')'
+    return fragment, dict(zip(names, values))
+
+
+_SCIENCE_PROPOSAL_TYPES_SQL, _SCIENCE_PROPOSAL_TYPES_PARAMS = _in_clause('proposal_type', SCIENCE_PROPOSAL_TYPES)
+
+# parts of the codes of the proposals whose exposures count as shutter open time, and a regular expression matching
+# codes containing any of them
+_SHUTTER_OPEN_PROPOSAL_CODE_PARTS = ('SCI', 'MLT', 'DDT', 'COM', 'SVP')
+_SHUTTER_OPEN_PROPOSAL_CODE_PATTERN = '|'.join(_SHUTTER_OPEN_PROPOSAL_CODE_PARTS)
+
+_OBSERVATION_TIME_AND_BLOCK_VISITS_SQL = text("""SELECT ni.Date AS Date,
+                                                      SUM(b.ObsTime) AS ObsTime,
+                                                      COUNT(bv.BlockVisit_Id) AS BlockCount
+                                               FROM NightInfo AS ni
+                                               JOIN BlockVisit AS bv USING (NightInfo_Id)
+                                               JOIN Block AS b USING (Block_Id)
+                                               JOIN Proposal AS p USING (Proposal_Id)
+                                               JOIN ProposalType AS pt USING (ProposalType_Id)
+                                               WHERE bv.Accepted = 1
+                                                     AND pt.ProposalType IN {proposal_types}
+                                                     AND (ni.Date BETWEEN :start_date AND :end_date)
+                                               GROUP BY ni.Date
+                                               ORDER BY ni.Date"""
+                                              .format(proposal_types=_SCIENCE_PROPOSAL_TYPES_SQL))
+
+_TIME_BREAKDOWN_SQL = text("""SELECT ni.Date AS Date,
+                                   ni.TimeLostToWeather AS TimeLostToWeather,
+                                   ni.TimeLostToProblems AS TimeLostToProblems,
+                                   ni.EngineeringTime AS EngineeringTime,
+                                   ni.ScienceTime AS ScienceTime,
+                                   TIMESTAMPDIFF(SECOND, ni.EveningTwilightEnd, ni.MorningTwilightStart) AS NightLength
+                            FROM NightInfo AS ni
+                            WHERE ni.Date BETWEEN :start_date AND :end_date
+                            ORDER BY ni.Date""")
+
+_SUBSYSTEM_LOSS_BREAKDOWN_SQL = text("""SELECT ni.Date AS Date,
+                                             s.SaltSubsystem AS SaltSubsystem,
+                                             SUM(TimeLost) as "Time"
+                                      FROM Fault AS f
+                                      JOIN NightInfo AS ni USING (NightInfo_Id)
+                                      JOIN SaltSubsystem AS s USING (SaltSubsystem_Id)
+                                      WHERE f.Deleted=0 AND Timelost IS NOT NULL
+                                            AND (ni.Date BETWEEN :start_date AND :end_date)
+                                      GROUP BY ni.Date, s.SaltSubsystem""")
+
+# text() escapes percent signs itself, so the LIKE patterns use single percent signs
+_SHUTTER_OPEN_TIME_SELECT = """SELECT DATE(DATE_SUB(UTStart, INTERVAL 12 HOUR)) AS Date,
+                                         SUM(NExposures*ExposureTime) AS ShutterOpenTime
+                                  FROM FileData AS fd
+                                  JOIN ProposalCode AS pc using (ProposalCode_Id)
+                                  JOIN FitsHeaderImage AS fhi using (FileData_Id)
+                                  WHERE (fd.UTStart >= :start_time AND fd.UTStart <= :end_time)
+                                        AND (fd.FileName LIKE 'S%'
+                                            OR fd.FileName LIKE 'P%'
+                                            OR fd.FileName LIKE 'H%fits')
+                                        AND pc.Proposal_Code REGEXP :proposal_code_pattern
+                                        AND (fhi.OBSTYPE='OBJECT' OR fhi.OBSTYPE='SCIENCE')
+                                  GROUP BY Date"""
+
+_SHUTTER_OPEN_TIME_SQL = text(_SHUTTER_OPEN_TIME_SELECT)
+
+_SHUTTER_OPEN_AND_SCIENCE_TIME_SQL = text("""SELECT ni.Date AS Date,
+                                                  COALESCE(sot.ShutterOpenTime, 0) AS ShutterOpenTime,
+                                                  ni.ScienceTime AS ScienceTime
+                                           FROM NightInfo AS ni
+                                           LEFT JOIN ({shutter_open_time}) AS sot ON sot.Date = ni.Date
+                                           WHERE (ni.Date BETWEEN :start_date AND :end_date)
+                                                 AND ni.ScienceTime > 0.0001
+                                           ORDER BY ni.Date"""
+                                          .format(shutter_open_time=_SHUTTER_OPEN_TIME_SELECT))
+
+_PUBLICATIONS_SQL = text("""SELECT Year, Month, Publications
+                             FROM Publications
+                             WHERE (:start_year<Year OR (:start_year=Year AND :start_month<=Month))
+                                   AND (:end_year>Year OR (:end_year=Year AND :end_month>=Month))""")
+
+_COATED_SEGMENTS_SQL = text("""SELECT Segment, Date
+                                FROM SegmentCoating
+                                WHERE Date BETWEEN :start_date AND :end_date""")
+
+
+# results of queries, shared by all DateRangeQueries instances (and hence all requests) for a limited time
+_RESULTS_CACHE = TTLCache(maxsize=128, ttl=600)
+_RESULTS_CACHE_LOCK = threading.Lock()
+
+
+def _memoized(query):
+    """Decorator for memoizing the result of a `DateRangeQueries` query method.
+
+    The result is stored on the instance, so that a query is run only once per instance, even if the method is called
+    from different threads. Each query has its own lock, so that different queries of an instance may run concurrently.
+    The same data frame is returned for all calls, so it must not be modified in place.
+
+    In addition results are cached for ten minutes across instances, keyed by the query, the database connection and
+    the date range. Each instance gets its own copy of a result cached in this way.
+    """
+
+    @functools.wraps(query)
+    def wrapper(self):
+        with self._lock:
+            lock = self._query_locks.setdefault(query.__name__, threading.Lock())
+        with lock:
+            if query.__name__ not in self._results:
+                key = (query.__name__, str(self.con), self.start, self.end)
+                with _RESULTS_CACHE_LOCK:
+                    df = _RESULTS_CACHE.get(key)
+                if df is None:
+                    df = query(self)
+                    with _RESULTS_CACHE_LOCK:
+                        _RESULTS_CACHE[key] = df
+                self._results[query.__name__] = df.copy()
+            return self._results[query.__name__]
+
+    return wrapper
+
 
 class DateRangeQueries:
     """Statistics queries for a range of dates.
@@ -21,6 +173,10 @@ class DateRangeQueries:
         Last date to include in the query results.
     con: SQLAlchemy connectable(engine/connection) or database string URI
         Database connection to use for the queries.
+
+    The result of each query is memoized, so that an instance can be shared by several plots without querying the
+    database more than once. The returned data frames are shared as well and hence must not be modified in place.
+    Query results are also cached for ten minutes across instances with the same date range.
     """
 
     def __init__(self, start, end, con):
@@ -32,6 +188,12 @@ class DateRangeQueries:
         self.end = end
         self.con = con
 
+        self._results = {}
+        self._query_locks = {}
+        self._prefetched = set()
+        self._lock = threading.Lock()
+
+    @_memoized
     def observation_time(self):
         """Get the observation time for a range of dates.
 
@@ -52,24 +214,9 @@ class DateRangeQueries:
             The observation times.
         """
 
-        sql = """SELECT ni.Date AS Date,
-                            SUM(b.ObsTime) AS ObsTime
-                     FROM NightInfo AS ni
-                     JOIN BlockVisit AS bv USING (NightInfo_Id)
-                     JOIN Block AS b USING (Block_Id)
-                     JOIN Proposal AS p USING (Proposal_Id)
-                     JOIN ProposalType AS pt USING (ProposalType_Id)
-                     WHERE bv.Accepted = 1
-                           AND pt.ProposalType IN {proposal_types}
-                           AND (ni.Date BETWEEN DATE('{start_date}') AND DATE('{end_date}'))
-                     GROUP BY ni.NightInfo_Id
-                     ORDER BY ni.Date""" \
-            .format(proposal_types=SCIENCE_PROPOSAL_TYPES,
-                    start_date=self.start.strftime('%Y-%m-%d'),
-                    end_date=self.end.strftime('%Y-%m-%d'))
-
-        return pd.read_sql(sql, self.con)
+        return self.observation_time_and_block_visits()[['Date', 'ObsTime']]
 
+    @_memoized
     def time_breakdown(self):
         """Get the time breakdown for a range of dates.
 
@@ -86,7 +233,8 @@ class DateRangeQueries:
         - NightLength: The length of the night (in seconds), i.e. the time between end of evening twilight and start of
           morning twilight.
 
-        All times are limited to the period between end of evening twilight and start of morning twilight.
+        All times are limited to the period between end of evening twilight and start of morning twilight. The rows are
+        sorted by date.
 
         Params:
         -------
@@ -101,20 +249,9 @@ class DateRangeQueries:
             The time breakdown.
         """
 
-        sql = """SELECT ni.Date AS Date,
-                            ni.TimeLostToWeather AS TimeLostToWeather,
-                            ni.TimeLostToProblems AS TimeLostToProblems,
-                            ni.EngineeringTime AS EngineeringTime,
-                            ni.ScienceTime AS ScienceTime,
-                            TIMESTAMPDIFF(SECOND, ni.EveningTwilightEnd, ni.MorningTwilightStart) AS NightLength
-                     FROM NightInfo AS ni
-                     WHERE ni.Date BETWEEN DATE('{start_date}') AND DATE('{end_date}')
-                     ORDER BY ni.Date""" \
-            .format(start_date=self.start.strftime('%Y-%m-%d'),
-                    end_date=self.end.strftime('%Y-%m-%d'))
-
-        return pd.read_sql(sql, self.con)
+        return pd.read_sql(_TIME_BREAKDOWN_SQL, self.con, params=self._date_params())
 
+    @_memoized
     def subsystem_loss_breakdown(self):
         """Get the subsystem breakdown of lost time for a range of dates.
 
@@ -140,20 +277,9 @@ class DateRangeQueries:
             The subsystem breakdown of lost time.
         """
 
-        sql = """SELECT ni.Date AS Date,
-                            s.SaltSubsystem AS SaltSubsystem,
-                            SUM(TimeLost) as "Time"
-                            FROM Fault AS f
-                            JOIN NightInfo AS ni USING (NightInfo_Id)
-                            JOIN SaltSubsystem AS s USING (SaltSubsystem_Id)
-                            WHERE f.Deleted=0 AND Timelost IS NOT NULL
-                                  AND (ni.Date BETWEEN DATE('{start_date}') AND DATE('{end_date}'))
-                            GROUP BY ni.Date, s.SaltSubsystem""" \
-            .format(start_date=self.start.strftime('%Y-%m-%d'),
-                    end_date=self.end.strftime('%Y-%m-%d'))
-
-        return pd.read_sql(sql, self.con)
+        return pd.read_sql(_SUBSYSTEM_LOSS_BREAKDOWN_SQL, self.con, params=self._date_params())
 
+    @_memoized
     def shutter_open_time(self):
         """Get the shutter open time for a range of dates.
 
@@ -173,27 +299,33 @@ class DateRangeQueries:
             The shutter open time.
         """
 
-        sql = """SELECT DATE(DATE_SUB(UTStart, INTERVAL 12 HOUR)) AS Date,
-                            SUM(NExposures*ExposureTime) AS ShutterOpenTime
-                            FROM FileData AS fd
-                            JOIN ProposalCode AS pc using (ProposalCode_Id)
-                            JOIN FitsHeaderImage AS fhi using (FileData_Id)
-                            WHERE (fd.UTStart >= '{start_date} 12:00:00' AND fd.UTStart <= '{end_date} 12:00:00')
-                                  AND (fd.FileName LIKE 'S%%'
-                                      OR fd.FileName LIKE 'P%%'
-                                      OR fd.FileName LIKE 'H%%fits')
-                                  AND (pc.Proposal_Code like '%%SCI%%'
-                                      OR pc.Proposal_Code like '%%MLT%%'
-                                      OR pc.Proposal_Code like '%%DDT%%'
-                                      OR pc.Proposal_Code like '%%COM%%'
-                                      OR pc.Proposal_Code LIKE '%%SVP%%')
-                                  AND (fhi.OBSTYPE='OBJECT' OR fhi.OBSTYPE='SCIENCE')
-                            GROUP BY Date""" \
-            .format(start_date=self.start.strftime('%Y-%m-%d'),
-                    end_date=(self.end + datetime.timedelta(days=1)).strftime('%Y-%m-%d'))
-
-        return pd.read_sql(sql, self.con)
+        return pd.read_sql(_SHUTTER_OPEN_TIME_SQL, self.con, params=self._shutter_open_time_params())
+
+    @_memoized
+    def shutter_open_and_science_time(self):
+        """Get the shutter open time and science time for a range of dates.
+
+        The data is given per date, and only dates with science time are included. The join of shutter open and
+        science times is done by the database. See the `shutter_open_time` and `time_breakdown` methods for details.
+
+        A data frame with the following columns is returned.
+
+        - Date: Date when the night starts.
+        - ShutterOpenTime: The exposure time (in seconds) spent on science and commissioning proposals. This is 0 if
+          there were no such exposures.
+        - ScienceTime: Time spent on science.
+
+        Returns:
+        --------
+        pandas.DataFrame:
+            The shutter open and science times.
+        """
+
+        params = dict(self._shutter_open_time_params(), **self._date_params())
 
+        return pd.read_sql(_SHUTTER_OPEN_AND_SCIENCE_TIME_SQL, self.con, params=params)
+
+    @_memoized
     def block_visits(self):
         """Get the number of accepted block visits for a range of dates.
 
@@ -203,7 +335,7 @@ class DateRangeQueries:
         A data frame with the following columns is returned.
 
         - Date: Date when the night starts.
-        - BlockCount: Number of block visits.
+        - BlockCount: Number of block visits (as a 32 bit integer).
 
         Returns:
         --------
@@ -211,23 +343,35 @@ class DateRangeQueries:
             The number of block visits.
         """
 
-        sql = """SELECT ni.Date AS Date,
-            COUNT(BlockVisit_Id) AS BlockCount
-        FROM NightInfo AS ni
-        JOIN BlockVisit AS bv USING (NightInfo_Id)
-        JOIN Block AS b USING (Block_Id)
-        JOIN Proposal AS p USING (Proposal_Id)
-        JOIN ProposalType AS pt USING (ProposalType_Id)
-        WHERE bv.Accepted=1
-        AND pt.ProposalType IN {proposal_types}
-        AND (ni.Date BETWEEN DATE('{start_date}') AND DATE('{end_date}'))
-        GROUP BY DATE""" \
-            .format(proposal_types=SCIENCE_PROPOSAL_TYPES,
-                      start_date=self.start.strftime('%Y-%m-%d'),
-                      end_date=self.end.strftime('%Y-%m-%d'))
-
-        return pd.read_sql(sql, self.con)
+        return self.observation_time_and_block_visits()[['Date', 'BlockCount']]
+
+    @_memoized
+    def observation_time_and_block_visits(self):
+        """Get the observation time and the number of accepted block visits for a range of dates.
+
+        Both are obtained with a single query, as they are aggregated from the same block visits. See the
+        `observation_time` and `block_visits` methods for details.
+
+        A data frame with the following columns is returned.
+
+        - Date: Date when the night starts.
+        - ObsTime: Observation time.
+        - BlockCount: Number of block visits (as a 32 bit integer).
+
+        Returns:
+        --------
+        pandas.DataFrame
+            The observation times and numbers of block visits.
+        """
+
+        df = pd.read_sql(_OBSERVATION_TIME_AND_BLOCK_VISITS_SQL, self.con, params=self._proposal_type_params())
+
+        # the number of block visits per night is small, so 32 bit integers are sufficient
+        df['BlockCount'] = df['BlockCount'].astype(np.int32)
 
+        return df
+
+    @_memoized
     def publications(self):
         """Get the number of publications for a range of dates.
 
@@ -246,17 +390,14 @@ class DateRangeQueries:
             The number of publications.
         """
 
-        sql = """SELECT Year, Month, Publications
-                 FROM Publications
-                 WHERE ({start_year}<Year OR ({start_year}=Year AND {start_month}<=Month))
-                       AND ({end_year}>Year OR ({end_year}=YEAR AND {end_month}>=Month))""" \
-             .format(start_year=self.start.year,
-                     start_month=self.start.month,
-                     end_year=self.end.year,
-                     end_month=self.end.month)
+        params = dict(start_year=self.start.year,
+                      start_month=self.start.month,
+                      end_year=self.end.year,
+                      end_month=self.end.month)
 
-        return pd.read_sql(sql, self.con)
+        return pd.read_sql(_PUBLICATIONS_SQL, self.con, params=params)
 
+    @_memoized
     def coated_segments(self):
         """Get the dates when mirror segments were coated.
 
@@ -271,10 +412,41 @@ class DateRangeQueries:
             The dates.
         """
 
-        sql = """SELECT Segment, Date
-                 FROM SegmentCoating
-                 WHERE Date BETWEEN DATE('{start_date}') AND DATE('{end_date}')""" \
-             .format(start_date=self.start,
-                     end_date=self.end)
+        return pd.read_sql(_COATED_SEGMENTS_SQL, self.con, params=self._date_params())
+
+    def prefetch(self, *queries):
+        """Start running queries in the background.
+
+        The queries are run concurrently with `EXECUTOR`, and their results are memoized as usual. Calling the method
+        of a query which is still running blocks until the query has finished. Queries which have been prefetched before
+        are ignored.
+
+        Params:
+        -------
+        *queries : str
+            Names of the query methods, such as 'time_breakdown'.
+        """
+
+        with self._lock:
+            names = [name for name in queries if name not in self._prefetched]
+            self._prefetched.update(names)
+        for name in names:
+            EXECUTOR.submit(getattr(self, name))
+
+    def _date_params(self):
+        """Parameters for the start and end date of the queries."""
+
+        return dict(start_date=self.start, end_date=self.end)
+
+    def _shutter_open_time_params(self):
+        """Parameters for the shutter open time queries."""
+
+        noon = datetime.time(12, 0, 0)
+        return dict(start_time=datetime.datetime.combine(self.start, noon),
+                    end_time=datetime.datetime.combine(self.end + datetime.timedelta(days=1), noon),
+                    proposal_code_pattern=_SHUTTER_OPEN_PROPOSAL_CODE_PATTERN)
+
+    def _proposal_type_params(self):
+        """Parameters for the queries restricted to science proposal types."""
 
-        return pd.read_sql(sql, self.con)
\ No newline at end of file
+        return dict(_SCIENCE_PROPOSAL_TYPES_PARAMS, **self._date_params())
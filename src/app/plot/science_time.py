@@ -1,16 +1,22 @@
 import datetime
 import functools
 
-import numpy as np
+import pandas as pd
 
 from bokeh.models import Range1d
 from bokeh.models.formatters import PrintfTickFormatter
 from app import db
 from app.plot.plot import DialPlot
 from app.plot.queries import DateRangeQueries
-from app.plot.util import bin_by_semester, daily_bar_plot, day_range, day_running_average, \
-    good_mediocre_bad_color_func, monthly_bar_plot, month_range, month_running_average, \
-    required_for_semester_average, semester, value_last_night, value_last_week
+from app.plot.util import add_night_length_percentage, bin_by_semester, daily_bar_plot, day_range, \
+    day_running_average, good_mediocre_bad_color_func, monthly_bar_plot, month_range, month_running_average, \
+    percentage, required_for_semester_average, semester, to_date_values, values_last_night, values_last_week
+
+_DIAL_COLOR_FUNC = good_mediocre_bad_color_func(good_limit=47, bad_limit=37)
+_SEMESTER_DIAL_COLOR_FUNC = good_mediocre_bad_color_func(good_limit=49, bad_limit=40)
+_DIAL_LABEL_VALUES = (0, 10, 20, 30, 37, 47, 60, 70, 80, 90, 100)
+_SEMESTER_DIAL_LABEL_VALUES = tuple(range(0, 46, 5)) + (49,) + tuple(range(55, 76, 5))
+_MONTHLY_POST_BINNING_FUNC = functools.partial(add_night_length_percentage, time_column='ScienceTime')
 
 
 class ScienceTimePlots:
@@ -20,18 +26,26 @@ class ScienceTimePlots:
     -------
     date : datetime.date
         The date for which to generate the plots.
+    queries : app.plot.queries.DateRangeQueries, optional
+        Queries to use for obtaining the data. Their date range must include the 300 days before and the 150 days after
+        `date`. By default new queries are created.
     **kwargs: keyword arguments
         Additional keyword arguments are passed on to the function or constructor creating a plot.
     """
 
-    def __init__(self, date, **kwargs):
+    def __init__(self, date, queries=None, **kwargs):
         self.date = date
         start = self.date - datetime.timedelta(days=300)
         end = self.date + datetime.timedelta(days=150)
 
         self.kwargs = kwargs
 
-        self.df = DateRangeQueries(start, end, db.engine).time_breakdown()[['Date', 'NightLength', 'ScienceTime']]
+        if queries is None:
+            queries = DateRangeQueries(start, end, db.engine)
+
+        self.df = queries.time_breakdown()[['Date', 'NightLength', 'ScienceTime']]
+
+        self._dates = to_date_values(self.df, 'Date')
 
     def last_night_plot(self):
         """Dial plot displaying the science time for the date preceding `self.date`.
@@ -45,15 +59,16 @@ class ScienceTimePlots:
             Plot displaying the science time for last night.
         """
 
-        science_time = value_last_night(df=self.df, date=self.date, date_column='Date', value_column='ScienceTime')
-        night_length = value_last_night(df=self.df, date=self.date, date_column='Date', value_column='NightLength')
+        science_time, night_length = values_last_night(df=self.df,
+                                                       date=self.date,
+                                                       date_column='Date',
+                                                       value_columns=['ScienceTime', 'NightLength'],
+                                                       date_values=self._dates)
         science_time_percentage = 100 * science_time / night_length
 
-        dial_color_func = good_mediocre_bad_color_func(good_limit=47, bad_limit=37)
-
         return DialPlot(values=[science_time_percentage],
-                        label_values=[0, 10, 20, 30, 37, 47, 60, 70, 80, 90, 100],
-                        dial_color_func=dial_color_func,
+                        label_values=_DIAL_LABEL_VALUES,
+                        dial_color_func=_DIAL_COLOR_FUNC,
                         display_values=['{:.1f}%'.format(science_time_percentage),
                                         '{:d}m'.format(int(science_time / 60))],
                         **self.kwargs)
@@ -70,15 +85,16 @@ class ScienceTimePlots:
             Plot displaying the science time for the last seven days.
         """
 
-        science_time = value_last_week(df=self.df, date=self.date, date_column='Date', value_column='ScienceTime')
-        night_length = value_last_week(df=self.df, date=self.date, date_column='Date', value_column='NightLength')
+        science_time, night_length = values_last_week(df=self.df,
+                                                      date=self.date,
+                                                      date_column='Date',
+                                                      value_columns=['ScienceTime', 'NightLength'],
+                                                      date_values=self._dates)
         science_time_percentage = 100 * science_time / night_length
 
-        dial_color_func = good_mediocre_bad_color_func(good_limit=47, bad_limit=37)
-
         return DialPlot(values=[science_time_percentage],
-                        label_values=[0, 10, 20, 30, 37, 47, 60, 70, 80, 90, 100],
-                        dial_color_func=dial_color_func,
+                        label_values=_DIAL_LABEL_VALUES,
+                        dial_color_func=_DIAL_COLOR_FUNC,
                         display_values=['{:.1f}%'.format(science_time_percentage),
                                         '{:d}m'.format(int(science_time / 60))],
                         **self.kwargs)
@@ -104,9 +120,11 @@ class ScienceTimePlots:
         start_date, end_date = day_range(self.date, days)
         trend_func = functools.partial(day_running_average, ignore_missing_values=False)
 
-        df = self.df.copy()
-        df['ScienceTimePercentage'] = 100 * np.divide(df.ScienceTime, df.NightLength)
-        df['ScienceTime'] /= 60
+        # only the columns needed for the plot are included, so that the original data needn't be copied
+        science_time = self.df.ScienceTime.values
+        df = pd.DataFrame(dict(Date=self.df.Date.values,
+                               ScienceTime=science_time / 60,
+                               ScienceTimePercentage=percentage(science_time, self.df.NightLength.values)))
 
         return daily_bar_plot(df=df,
                               start_date=start_date,
@@ -139,10 +157,6 @@ class ScienceTimePlots:
         start_date, end_date = month_range(self.date, months)
         trend_func = functools.partial(month_running_average, ignore_missing_values=False)
 
-        def post_binning_func(df):
-            df['ScienceTimePercentage'] = 100 * np.divide(df.ScienceTime, df.NightLength)
-            df.ScienceTime /= 3600
-
         return monthly_bar_plot(df=self.df,
                                 start_date=start_date,
                                 end_date=end_date,
@@ -153,7 +167,7 @@ class ScienceTimePlots:
                                 y_formatters=[PrintfTickFormatter(format='%.0fh'),
                                               PrintfTickFormatter(format='%.0f%%')],
                                 trend_func=trend_func,
-                                post_binning_func=post_binning_func,
+                                post_binning_func=_MONTHLY_POST_BINNING_FUNC,
                                 **self.kwargs)
 
     def semester_to_date_plot(self):
@@ -175,23 +189,25 @@ class ScienceTimePlots:
         """
 
         sem = semester(self.date)
-        binned_df = bin_by_semester(df=self.df, cutoff_date=self.date, date_column='Date', semester_column='Semester')
-        current_semester = binned_df[binned_df.Semester == sem]
+        binned_df = bin_by_semester(df=self.df,
+                                    cutoff_date=self.date,
+                                    date_column='Date',
+                                    semester_column='Semester',
+                                    date_values=self._dates)
         target_percentage = 55
-        if len(current_semester):
-            science_time_percentage = 100 * current_semester.ScienceTime[0] / current_semester.NightLength[0]
+        if sem in binned_df.index:
+            row = binned_df.loc[sem]
+            science_time_percentage = 100 * row.ScienceTime / row.NightLength
             required_percentage = required_for_semester_average(self.date, science_time_percentage, target_percentage)
-            science_time = current_semester.ScienceTime[0] / 3600
+            science_time = row.ScienceTime / 3600
         else:
             science_time_percentage = 0
             required_percentage = target_percentage
             science_time = 0
 
-        dial_color_func = good_mediocre_bad_color_func(good_limit=49, bad_limit=40)
-
         return DialPlot(values=[science_time_percentage, required_percentage],
-                        label_values=[v for v in range(0, 46, 5)] + [49] + [v for v in range(55, 76, 5)],
-                        dial_color_func=dial_color_func,
+                        label_values=_SEMESTER_DIAL_LABEL_VALUES,
+                        dial_color_func=_SEMESTER_DIAL_COLOR_FUNC,
                         display_values=['{:.1f}%'.format(science_time_percentage),
                                         '{:.1f}h'.format(science_time)],
                         **self.kwargs)
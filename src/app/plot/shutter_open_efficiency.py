@@ -4,15 +4,14 @@ import functools
 from bokeh.models import Range1d
 from bokeh.models.formatters import PrintfTickFormatter
 import numpy as np
-import pandas as pd
 
 from app import db
 from app.plot.plot import DialPlot
 from app.plot.queries import DateRangeQueries
 from app.plot.util import bin_by_semester, daily_bar_plot, day_range, day_running_average, \
     month_range, monthly_bar_plot, month_running_average, \
-    neutral_color_func, required_for_semester_average, semester,\
-    value_last_night, value_last_week
+    neutral_color_func, percentage, required_for_semester_average, semester,\
+    to_date_values, values_last_night, values_last_week
 
 
 class ShutterOpenEfficiencyPlots:
@@ -26,53 +25,60 @@ class ShutterOpenEfficiencyPlots:
     -------
     date : datetime.date
         Date for which the plots are generated.
+    queries : app.plot.queries.DateRangeQueries, optional
+        Queries to use for obtaining the data. Their date range must include the 300 days before and the 150 days after
+        `date`. By default new queries are created.
     **kwargs: keyword arguments
         Additional keyword arguments are passed on to the function or constructor creating a plot.
     """
 
-    def __init__(self, date, **kwargs):
+    def __init__(self, date, queries=None, **kwargs):
         self.date = date
         start = self.date - datetime.timedelta(days=300)
         end = self.date + datetime.timedelta(days=150)
 
         self.kwargs = kwargs
 
-        queries = DateRangeQueries(start, end, db.engine)
-        df_shutter_open_time = queries.shutter_open_time()
-        df_time_breakdown = queries.time_breakdown()
-        self.df = pd.merge(df_shutter_open_time, df_time_breakdown, on=['Date'], how='outer')
+        if queries is None:
+            queries = DateRangeQueries(start, end, db.engine)
 
-        # ignore values with no science time
-        self.df = self.df[self.df.ScienceTime > 0.0001]
+        # the query only includes dates with science time, sorted by date (as required for filtering by date with a
+        # binary search)
+        df = queries.shutter_open_and_science_time()
 
-        # avoid NaN issues later on
-        self.df.fillna(value=0, inplace=True)
+        # the daily shutter open efficiency, which is needed by the daily plot
+        self.df = df.assign(ShutterOpenEfficiency=percentage(df.ShutterOpenTime.values, df.ScienceTime.values))
+        self._dates = to_date_values(self.df, 'Date')
 
     def last_night_plot(self):
         """Dial plot displaying the operation efficiency for last night."""
 
-        shutter_open_time = value_last_night(df=self.df, date=self.date, date_column='Date',
-                                             value_column='ShutterOpenTime')
-        science_time = value_last_night(df=self.df, date=self.date, date_column='Date', value_column='ScienceTime')
+        shutter_open_time, science_time = values_last_night(df=self.df,
+                                                            date=self.date,
+                                                            date_column='Date',
+                                                            value_columns=['ShutterOpenTime', 'ScienceTime'],
+                                                            date_values=self._dates)
         shutter_open_efficiency = self._shutter_open_efficiency(shutter_open_time, science_time)
 
         return DialPlot(values=[shutter_open_efficiency],
                         label_values=range(0, 151, 10),
                         dial_color_func=neutral_color_func,
-                        display_values=[str(round(shutter_open_efficiency, 1)) + '%'])
+                        display_values=['{:.1f}%'.format(shutter_open_efficiency)])
 
     def week_to_date_plot(self):
         """Dial plot displaying the operation efficiency for the seven days leading up to but excluding `self.date`."""
 
-        shutter_open_time = value_last_week(df=self.df, date=self.date, date_column='Date',
-                                            value_column='ShutterOpenTime')
-        science_time = value_last_week(df=self.df, date=self.date, date_column='Date', value_column='ScienceTime')
+        shutter_open_time, science_time = values_last_week(df=self.df,
+                                                           date=self.date,
+                                                           date_column='Date',
+                                                           value_columns=['ShutterOpenTime', 'ScienceTime'],
+                                                           date_values=self._dates)
         shutter_open_efficiency = self._shutter_open_efficiency(shutter_open_time, science_time)
 
         return DialPlot(values=[shutter_open_efficiency],
                         label_values=range(0, 151, 10),
                         dial_color_func=neutral_color_func,
-                        display_values=[str(round(shutter_open_efficiency, 1)) + '%'],
+                        display_values=['{:.1f}%'.format(shutter_open_efficiency)],
                         **self.kwargs)
 
     def daily_plot(self, days):
@@ -93,13 +99,10 @@ class ShutterOpenEfficiencyPlots:
             Plot of shutter open efficiency as a function of the day.
         """
 
-        df = self.df.copy()
-        df['ShutterOpenEfficiency'] = 100 * np.divide(df.ShutterOpenTime, df.ScienceTime)
-
         start_date, end_date = day_range(self.date, days)
         trend_func = functools.partial(day_running_average, ignore_missing_values=True)
 
-        return daily_bar_plot(df=df,
+        return daily_bar_plot(df=self.df,
                               start_date=start_date,
                               end_date=end_date,
                               date_column='Date',
@@ -130,9 +133,6 @@ class ShutterOpenEfficiencyPlots:
         start_date, end_date = month_range(self.date, months)
         trend_func = functools.partial(month_running_average, ignore_missing_values=False)
 
-        def post_binning_func(df):
-            df['ShutterOpenEfficiency'] = 100 * np.divide(df.ShutterOpenTime, df.ScienceTime)
-
         return monthly_bar_plot(df=self.df,
                                 start_date=start_date,
                                 end_date=end_date,
@@ -142,7 +142,7 @@ class ShutterOpenEfficiencyPlots:
                                 y_range=Range1d(start=0, end=80),
                                 y_formatters=[PrintfTickFormatter(format='%d%%')],
                                 trend_func=trend_func,
-                                post_binning_func=post_binning_func,
+                                post_binning_func=self._monthly_post_binning,
                                 **self.kwargs)
 
     def semester_to_date_plot(self):
@@ -158,11 +158,14 @@ class ShutterOpenEfficiencyPlots:
         """
 
         sem = semester(self.date)
-        binned_df = bin_by_semester(df=self.df, cutoff_date=self.date, date_column='Date', semester_column='Semester')
-        current_semester = binned_df[binned_df.Semester == sem]
-        if len(current_semester):
-            shutter_open_efficiency = self._shutter_open_efficiency(current_semester.ShutterOpenTime[0],
-                                                                current_semester.ScienceTime[0])
+        binned_df = bin_by_semester(df=self.df,
+                                    cutoff_date=self.date,
+                                    date_column='Date',
+                                    semester_column='Semester',
+                                    date_values=self._dates)
+        if sem in binned_df.index:
+            row = binned_df.loc[sem]
+            shutter_open_efficiency = self._shutter_open_efficiency(row.ShutterOpenTime, row.ScienceTime)
         else:
             shutter_open_efficiency = 0
 
@@ -174,5 +177,19 @@ class ShutterOpenEfficiencyPlots:
                         display_values=['{:.1f}%'.format(shutter_open_efficiency)],
                         **self.kwargs)
 
+    @staticmethod
+    def _monthly_post_binning(df):
+        """Add the shutter open efficiency to monthly binned data.
+
+        The shutter open efficiency is computed from the underlying NumPy arrays, with a single array allocation.
+
+        Params:
+        -------
+        df : pandas.DataFrame
+            Binned data. This data frame is modified in place.
+        """
+
+        df['ShutterOpenEfficiency'] = percentage(df.ShutterOpenTime.values, df.ScienceTime.values)
+
     def _shutter_open_efficiency(self, obs_time, science_time):
         return 100 * obs_time / science_time if science_time else np.NaN
@@ -1,16 +1,21 @@
 import datetime
 import functools
 
-import numpy as np
+import pandas as pd
 
 from bokeh.models import Range1d
 from bokeh.models.formatters import PrintfTickFormatter
 from app import db
 from app.plot.plot import DialPlot
 from app.plot.queries import DateRangeQueries
-from app.plot.util import bin_by_semester, daily_bar_plot, day_range, day_running_average, \
-    good_mediocre_bad_color_func, monthly_bar_plot, month_range, month_running_average, \
-    required_for_semester_average, semester, value_last_night, value_last_week
+from app.plot.util import add_night_length_percentage, bin_by_semester, daily_bar_plot, day_range, \
+    day_running_average, good_mediocre_bad_color_func, monthly_bar_plot, month_range, month_running_average, \
+    percentage, required_for_semester_average, semester, to_date_values, values_last_night, values_last_week
+
+_DIAL_COLOR_FUNC = good_mediocre_bad_color_func(good_limit=3, bad_limit=6)
+_DIAL_LABEL_VALUES = (0, 3, 6) + tuple(range(10, 101, 10))
+_SEMESTER_DIAL_LABEL_VALUES = tuple(range(0, 16))
+_MONTHLY_POST_BINNING_FUNC = functools.partial(add_night_length_percentage, time_column='TimeLostToProblems')
 
 
 class TelescopeDowntimePlots:
@@ -20,19 +25,26 @@ class TelescopeDowntimePlots:
     -------
     date : datetime.date
         The date for which to generate the plots.
+    queries : app.plot.queries.DateRangeQueries, optional
+        Queries to use for obtaining the data. Their date range must include the 300 days before and the 150 days after
+        `date`. By default new queries are created.
     **kwargs: keyword arguments
         Additional keyword arguments are passed on to the function or constructor creating a plot.
     """
 
-    def __init__(self, date, **kwargs):
+    def __init__(self, date, queries=None, **kwargs):
         self.date = date
         start = self.date - datetime.timedelta(days=300)
         end = self.date + datetime.timedelta(days=150)
 
         self.kwargs = kwargs
 
-        self.df = DateRangeQueries(start, end, db.engine)
-        self.df = self.df.time_breakdown()[['Date', 'NightLength', 'TimeLostToProblems']]
+        if queries is None:
+            queries = DateRangeQueries(start, end, db.engine)
+
+        self.df = queries.time_breakdown()[['Date', 'NightLength', 'TimeLostToProblems']]
+
+        self._dates = to_date_values(self.df, 'Date')
 
     def last_night_plot(self):
         """Dial plot displaying the weather downtime for the date preceding `self.date`.
@@ -46,18 +58,16 @@ class TelescopeDowntimePlots:
             Plot displaying the weather downtime for last night.
         """
 
-        weather_downtime = value_last_night(df=self.df,
-                                            date=self.date,
-                                            date_column='Date',
-                                            value_column='TimeLostToProblems')
-        night_length = value_last_night(df=self.df, date=self.date, date_column='Date', value_column='NightLength')
+        weather_downtime, night_length = values_last_night(df=self.df,
+                                                           date=self.date,
+                                                           date_column='Date',
+                                                           value_columns=['TimeLostToProblems', 'NightLength'],
+                                                           date_values=self._dates)
         weather_downtime_percentage = 100 * weather_downtime / night_length
 
-        dial_color_func = good_mediocre_bad_color_func(good_limit=3, bad_limit=6)
-
         return DialPlot(values=[weather_downtime_percentage],
-                        label_values=[0, 3, 6] + [v for v in range(10, 101, 10)],
-                        dial_color_func=dial_color_func,
+                        label_values=_DIAL_LABEL_VALUES,
+                        dial_color_func=_DIAL_COLOR_FUNC,
                         display_values=['{:.1f}%'.format(weather_downtime_percentage),
                                         '{:d}m'.format(int(weather_downtime / 60))],
                         **self.kwargs)
@@ -74,18 +84,16 @@ class TelescopeDowntimePlots:
             Plot displaying the weather downtime for the last seven days.
         """
 
-        weather_downtime = value_last_week(df=self.df,
-                                           date=self.date,
-                                           date_column='Date',
-                                           value_column='TimeLostToProblems')
-        night_length = value_last_week(df=self.df, date=self.date, date_column='Date', value_column='NightLength')
+        weather_downtime, night_length = values_last_week(df=self.df,
+                                                          date=self.date,
+                                                          date_column='Date',
+                                                          value_columns=['TimeLostToProblems', 'NightLength'],
+                                                          date_values=self._dates)
         weather_downtime_percentage = 100 * weather_downtime / night_length
 
-        dial_color_func = good_mediocre_bad_color_func(good_limit=3, bad_limit=6)
-
         return DialPlot(values=[weather_downtime_percentage],
-                        label_values=[0, 3, 6] + [v for v in range(10, 101, 10)],
-                        dial_color_func=dial_color_func,
+                        label_values=_DIAL_LABEL_VALUES,
+                        dial_color_func=_DIAL_COLOR_FUNC,
                         display_values=['{:.1f}%'.format(weather_downtime_percentage),
                                         '{:d}m'.format(int(weather_downtime / 60))],
                         **self.kwargs)
@@ -111,9 +119,11 @@ class TelescopeDowntimePlots:
         start_date, end_date = day_range(self.date, days)
         trend_func = functools.partial(day_running_average, ignore_missing_values=False)
 
-        df = self.df.copy()
-        df['TimeLostToProblemsPercentage'] = 100 * np.divide(df.TimeLostToProblems, df.NightLength)
-        df['TimeLostToProblems'] /= 60
+        # only the columns needed for the plot are included, so that the original data needn't be copied
+        time_lost = self.df.TimeLostToProblems.values
+        df = pd.DataFrame(dict(Date=self.df.Date.values,
+                               TimeLostToProblems=time_lost / 60,
+                               TimeLostToProblemsPercentage=percentage(time_lost, self.df.NightLength.values)))
 
         return daily_bar_plot(df=df,
                               start_date=start_date,
@@ -146,10 +156,6 @@ class TelescopeDowntimePlots:
         start_date, end_date = month_range(self.date, months)
         trend_func = functools.partial(month_running_average, ignore_missing_values=False)
 
-        def post_binning_func(df):
-            df['TimeLostToProblemsPercentage'] = 100 * np.divide(df.TimeLostToProblems, df.NightLength)
-            df.TimeLostToProblems /= 3600
-
         return monthly_bar_plot(df=self.df,
                                 start_date=start_date,
                                 end_date=end_date,
@@ -160,7 +166,7 @@ class TelescopeDowntimePlots:
                                 y_formatters=[PrintfTickFormatter(format='%.0fh'),
                                               PrintfTickFormatter(format='%.0f%%')],
                                 trend_func=trend_func,
-                                post_binning_func=post_binning_func,
+                                post_binning_func=_MONTHLY_POST_BINNING_FUNC,
                                 **self.kwargs)
 
     def semester_to_date_plot(self):
@@ -182,26 +188,28 @@ class TelescopeDowntimePlots:
         """
 
         sem = semester(self.date)
-        binned_df = bin_by_semester(df=self.df, cutoff_date=self.date, date_column='Date', semester_column='Semester')
-        current_semester = binned_df[binned_df.Semester == sem]
+        binned_df = bin_by_semester(df=self.df,
+                                    cutoff_date=self.date,
+                                    date_column='Date',
+                                    semester_column='Semester',
+                                    date_values=self._dates)
         target_percentage = 3
-        if len(current_semester):
+        if sem in binned_df.index:
+            row = binned_df.loc[sem]
             telescope_downtime_percentage =\
-                100 * current_semester.TimeLostToProblems[0] / current_semester.NightLength[0]
+                100 * row.TimeLostToProblems / row.NightLength
             required_percentage = required_for_semester_average(self.date,
                                                                 telescope_downtime_percentage,
                                                                 target_percentage)
-            telescope_downtime = current_semester.TimeLostToProblems[0] / 3600
+            telescope_downtime = row.TimeLostToProblems / 3600
         else:
             telescope_downtime_percentage = 0
             required_percentage = target_percentage
             telescope_downtime = 0
 
-        dial_color_func = good_mediocre_bad_color_func(good_limit=3, bad_limit=6)
-
         return DialPlot(values=[telescope_downtime_percentage, required_percentage],
-                        label_values=range(0, 16, 1),
-                        dial_color_func=dial_color_func,
+                        label_values=_SEMESTER_DIAL_LABEL_VALUES,
+                        dial_color_func=_DIAL_COLOR_FUNC,
                         display_values=['{:.1f}%'.format(telescope_downtime_percentage),
                                         '{:.1f}h'.format(telescope_downtime)],
                         **self.kwargs)
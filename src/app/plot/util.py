@@ -49,7 +49,7 @@ def bin_by_date(df, date_column, agg_func=np.sum):
     grouped = df.groupby(night).aggregate(agg_func)
 
     # add date column
-    grouped[date_column] = [parser.parse(d).date() for d in grouped.index]
+    grouped[date_column] = pandas.to_datetime(grouped.index).date
 
     return grouped
 
@@ -108,7 +108,7 @@ def bin_by_month(df, date_column, month_column, agg_func=np.sum):
 DX_AVERAGE_MONTH = datetime.timedelta(seconds=365.25 * 24 * 3600 / 12)  # average month length
 
 
-def bin_by_semester(df, cutoff_date, date_column, semester_column, agg_func=np.sum):
+def bin_by_semester(df, cutoff_date, date_column, semester_column, agg_func=np.sum, date_values=None):
     """Bin data by semester.
 
     The data frame data is grouped by semester according to the values of the specified date column, and then the
@@ -134,13 +134,19 @@ def bin_by_semester(df, cutoff_date, date_column, semester_column, agg_func=np.s
         Name to use for the column of semesters.
     agg_func: function, optional
         Aggregation function applied to the groups of values sharing the same month. The default is to sum the values.
+    date_values: numpy.ndarray, optional
+        The values of the date column as an array of type `datetime64[D]`, which must be sorted in ascending order. If
+        this is supplied, it is used for filtering (by means of a binary search) instead of the date column.
 
     Return:
     pandas.DataFrame
         The binned data.
     """
 
-    df = df[df[date_column] < cutoff_date]
+    if date_values is not None:
+        df = df.iloc[:np.searchsorted(date_values, np.datetime64(cutoff_date, 'D'))]
+    else:
+        df = df[df[date_column] < cutoff_date]
 
     def sem(x):
         return semester(df[date_column].loc[x])
@@ -154,7 +160,30 @@ def bin_by_semester(df, cutoff_date, date_column, semester_column, agg_func=np.s
     return grouped
 
 
-def filter_days_to_date(df, date, days, date_column):
+def to_date_values(df, date_column):
+    """The dates of a data frame column as a NumPy array of type `datetime64[D]`.
+
+    The array can be passed as the `date_values` argument of the filtering and binning functions in this module, which
+    then filter by means of a binary search rather than by comparing every date. For this the data frame must be sorted
+    by date in ascending order.
+
+    Params:
+    -------
+    df : pandas.DataFrame
+        Data frame.
+    date_column : str
+        Name of the column containing the dates.
+
+    Returns:
+    --------
+    numpy.ndarray
+        The dates.
+    """
+
+    return df[date_column].values.astype('datetime64[D]')
+
+
+def filter_days_to_date(df, date, days, date_column, date_values=None):
     """Subset for dates within the week preceding a date.
 
     `df` is filtered by applying the criterion that the date in the `date_column` column is one of the `days` days
@@ -170,6 +199,9 @@ def filter_days_to_date(df, date, days, date_column):
         Number of days.
     date_column : str
         Name of the column containing the dates.
+    date_values : numpy.ndarray, optional
+        The values of the date column as an array of type `datetime64[D]`, which must be sorted in ascending order. If
+        this is supplied, it is used for filtering (by means of a binary search) instead of the date column.
 
     Returns:
     --------
@@ -189,11 +221,16 @@ def filter_days_to_date(df, date, days, date_column):
     2  2016-05-03      1
     """
 
+    if date_values is not None:
+        end = np.datetime64(date, 'D')
+        first, last = np.searchsorted(date_values, [end - np.timedelta64(days, 'D'), end])
+        return df.iloc[first:last]
+
     return df[(df[date_column] >= date - datetime.timedelta(days=days)) &
               (df[date_column] <= date - datetime.timedelta(days=1))]
 
 
-def filter_day_before_date(df, date, date_column):
+def filter_day_before_date(df, date, date_column, date_values=None):
     """Subset for the day before a date.
 
     `df` is filtered by applying the criterion that the date in the `date_column` column is equal to the day before
@@ -207,12 +244,14 @@ def filter_day_before_date(df, date, date_column):
         Date relative to which the data is filtered.
     date_column : str
         Name of the column containing the dates.
+    date_values : numpy.ndarray, optional
+        The values of the date column as an array of type `datetime64[D]`, sorted in ascending order.
     """
 
-    return filter_days_to_date(df=df, date=date, days=1, date_column=date_column)
+    return filter_days_to_date(df=df, date=date, days=1, date_column=date_column, date_values=date_values)
 
 
-def filter_week_to_date(df, date, date_column):
+def filter_week_to_date(df, date, date_column, date_values=None):
     """Subset for dates within the week preceding a date.
 
     `df` is filtered by applying the criterion that the date in the `date_column` column is one of the 7 days leading
@@ -226,9 +265,11 @@ def filter_week_to_date(df, date, date_column):
         Date relative to which the data is filtered.
     date_column : str
         Name of the column containing the dates.
+    date_values : numpy.ndarray, optional
+        The values of the date column as an array of type `datetime64[D]`, sorted in ascending order.
     """
 
-    return filter_days_to_date(df=df, date=date, days=7, date_column=date_column)
+    return filter_days_to_date(df=df, date=date, days=7, date_column=date_column, date_values=date_values)
 
 
 def value_last_night(df, date, date_column, value_column):
@@ -254,8 +295,46 @@ def value_last_night(df, date, date_column, value_column):
         The aggregate value for the date preceding `date`.
     """
 
-    last_night = filter_day_before_date(df=df, date=date, date_column=date_column)
-    return np.sum(last_night[value_column])
+    return values_last_night(df=df, date=date, date_column=date_column, value_columns=[value_column])[0]
+
+
+def values_last_night(df, date, date_column, value_columns, date_values=None):
+    """Aggregate values of data frame columns for the date preceding a given date.
+
+    This is equivalent to calling `value_last_night` for each of the columns, but the data frame is filtered only once.
+
+    Params:
+    -------
+    df : pandas.DataFrame
+        Data.
+    date : datetime.date
+        Date.
+    date_column : str
+        Name of the column containing the dates.
+    value_columns : list of str
+        Names of the columns containing the values to consider.
+    date_values : numpy.ndarray, optional
+        The values of the date column as an array of type `datetime64[D]`, which must be sorted in ascending order. If
+        this is supplied, it is used for filtering (by means of a binary search) instead of the date column.
+
+    Returns:
+    --------
+    tuple of float
+        The aggregate values for the date preceding `date`, in the order of `value_columns`.
+
+    Examples:
+    ---------
+    >>> values_last_night(pandas.DataFrame(dict(Date=[datetime.date(2016, 5, 2), datetime.date(2016, 5, 3)],\
+                                                A=[5, 8],\
+                                                B=[1, 4])),\
+                          datetime.date(2016, 5, 4),\
+                          'Date',\
+                          ['A', 'B'])
+    (8, 4)
+    """
+
+    last_night = filter_day_before_date(df=df, date=date, date_column=date_column, date_values=date_values)
+    return tuple(last_night[value_columns].sum().tolist())
 
 
 def value_last_week(df, date, date_column, value_column):
@@ -281,8 +360,36 @@ def value_last_week(df, date, date_column, value_column):
         The aggregate value for the seven days preceding `date`.
     """
 
-    last_week = filter_week_to_date(df=df, date=date, date_column=date_column)
-    return np.sum(last_week[value_column])
+    return values_last_week(df=df, date=date, date_column=date_column, value_columns=[value_column])[0]
+
+
+def values_last_week(df, date, date_column, value_columns, date_values=None):
+    """Aggregate values of data frame columns for the seven days leading up to but excluding a given date.
+
+    This is equivalent to calling `value_last_week` for each of the columns, but the data frame is filtered only once.
+
+    Params:
+    -------
+    df : pandas.DataFrame
+        Data.
+    date : datetime.date
+        Date.
+    date_column : str
+        Name of the column containing the dates.
+    value_columns : list of str
+        Names of the columns containing the values to consider.
+    date_values : numpy.ndarray, optional
+        The values of the date column as an array of type `datetime64[D]`, which must be sorted in ascending order. If
+        this is supplied, it is used for filtering (by means of a binary search) instead of the date column.
+
+    Returns:
+    --------
+    tuple of float
+        The aggregate values for the seven days preceding `date`, in the order of `value_columns`.
+    """
+
+    last_week = filter_week_to_date(df=df, date=date, date_column=date_column, date_values=date_values)
+    return tuple(last_week[value_columns].sum().tolist())
 
 
 def daily_bar_plot(df, start_date, end_date, date_column, y_column, y_range, trend_func, y_formatters=(),
@@ -510,6 +617,9 @@ def add_trend_curve(plot, df, x_min, x_max, dx, trend_func):
     if x_min >= x_max:
         raise ValueError('x_min ({x_min}) must be less than x_max ({x_max}'.format(x_min=x_min, x_max=x_max))
 
+    # the trend functions look up their windows with a binary search, which requires sorted x values
+    df = df.sort_values('x')
+
     x_arr = []
     x = x_min
     while x <= x_max:
@@ -668,7 +778,7 @@ def running_bin_average(df, window, dx, ignore_missing_values):
     -------
     df : pandas.DataFrame
         Data from which to calculate the running average at `x`. The data frame must have columns named 'x' and 'y', and
-        the x column must contain dates.
+        the x column must contain dates, sorted in ascending order.
     window: tuple of number-like
         Start and end of the window over which is averaged.
     dx : number-like
@@ -716,16 +826,19 @@ def running_bin_average(df, window, dx, ignore_missing_values):
     extended_start = start - 0.1 * dx   # the 0.1 * dx is added/subtracted to avoid rounding issues
     extended_end = end + 0.1 * dx
 
-    window_df = df[(df.x >= extended_start) & (df.x <= extended_end)]
+    # as the x values are sorted, the window is a contiguous slice which can be found by a binary search
+    x = df.x.values
+    first = np.searchsorted(x, extended_start, side='left')
+    last = np.searchsorted(x, extended_end, side='right')
     if ignore_missing_values:
-        bin_count = len(window_df)
+        bin_count = last - first
     else:
         bin_count = 1 + int(round((end - start) / dx))
 
     if bin_count == 0:
         return 0
 
-    return np.sum(window_df.y) / bin_count
+    return np.nansum(df.y.values[first:last]) / bin_count
 
 
 def day_range(date, days):
@@ -901,6 +1014,55 @@ def semester_range(date):
     return start, end
 
 
+def percentage(numerator, denominator):
+    """Ratio of two arrays as a percentage.
+
+    The ratio is scaled in place, so that only a single array is allocated for the result.
+
+    Params:
+    -------
+    numerator : numpy.ndarray
+        Numerator.
+    denominator : numpy.ndarray
+        Denominator.
+
+    Returns:
+    --------
+    numpy.ndarray
+        The percentage `100 * numerator / denominator`.
+
+    Examples:
+    ---------
+    >>> percentage(np.array([1, 3]), np.array([4, 4]))
+    array([ 25.,  75.])
+    """
+
+    ratio = np.divide(numerator, denominator)
+    ratio *= 100
+    return ratio
+
+
+def add_night_length_percentage(df, time_column):
+    """Add the percentage of a time relative to the night length to binned data, and convert the time to hours.
+
+    The percentage is stored in a column with the name of the time column followed by "Percentage". The data frame
+    must have a column `NightLength`. Times and night lengths must be given in seconds.
+
+    This function may be used as the `post_binning_func` of `monthly_bar_plot`.
+
+    Params:
+    -------
+    df : pandas.DataFrame
+        Binned data. This data frame is modified in place.
+    time_column : str
+        Name of the column containing the time.
+    """
+
+    time = df[time_column].values
+    df[time_column + 'Percentage'] = percentage(time, df['NightLength'].values)
+    df[time_column] = time / 3600
+
+
 def good_mediocre_bad_color_func(good_limit, bad_limit):
     """Generate the function for deciding what color to use for good, mediocre and bad values.
 
@@ -1 +1,2 @@
-SCIENCE_PROPOSAL_TYPES = "('Science', 'Science - Long Term', 'Key Science Program', 'Director Discretionary Time (DDT)', 'Science Verification')"
\ No newline at end of file
+SCIENCE_PROPOSAL_TYPES = ('Science', 'Science - Long Term', 'Key Science Program', 'Director Discretionary Time (DDT)',
+                          'Science Verification')
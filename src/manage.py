@@ -14,7 +14,7 @@ if os.path.exists('.env'):
             os.environ[var[0]] = var[1]
 
 from app import create_app
-from flask.ext.script import Manager, Shell
+from flask_script import Manager, Shell
 
 app = create_app(os.getenv('SALTSTATS_FLASK_CONFIG') or 'development')
 manager = Manager(app)
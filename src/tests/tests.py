@@ -1,11 +1,17 @@
+import colorsys
 import datetime
+import threading
+import time
 import unittest
 
 from dateutil import parser
 import numpy as np
 import pandas as pd
 
-from app.plot.util import bin_by_date, bin_by_month, bin_by_semester
+from app.plot.mirror_recoating import MirrorRecoatingPlot
+from app.plot.queries import _in_clause, _memoized, _RESULTS_CACHE, _RESULTS_CACHE_LOCK, DateRangeQueries
+from app.plot.util import bin_by_date, bin_by_month, bin_by_semester, filter_days_to_date, filter_week_to_date, \
+    percentage, running_bin_average, to_date_values, values_last_night, values_last_week
 
 
 class TestPlot(unittest.TestCase):
@@ -157,3 +163,204 @@ class TestPlot(unittest.TestCase):
         self.assertEqual('2023-1', binned['semesters'].iloc[4])
         self.assertEqual([0, 3, 7, 9, 10], binned['a'].values.tolist())
         self.assertEqual([0, 6, 14, 18, 20], binned['b'].values.tolist())
+
+    def _dates_and_values(self):
+        # 3 and 5 May 2016 are missing
+        dates = [datetime.date(2016, 5, 1),
+                 datetime.date(2016, 5, 2),
+                 datetime.date(2016, 5, 4),
+                 datetime.date(2016, 5, 6)]
+        df = pd.DataFrame(dict(Date=dates, A=[1, 2, 4, 8], B=[10, 20, 40, 80]))
+        return df, to_date_values(df, 'Date')
+
+    def test_values_last_night(self):
+        df, date_values = self._dates_and_values()
+
+        for kwargs in (dict(), dict(date_values=date_values)):
+            def last_night(date):
+                return values_last_night(df, date, 'Date', ['A', 'B'], **kwargs)
+
+            self.assertEqual((2, 20), last_night(datetime.date(2016, 5, 3)))
+            self.assertEqual((4, 40), last_night(datetime.date(2016, 5, 5)))
+            self.assertEqual((8, 80), last_night(datetime.date(2016, 5, 7)))
+
+            # date before the first date
+            self.assertEqual((0, 0), last_night(datetime.date(2016, 5, 1)))
+
+            # day before is missing
+            self.assertEqual((0, 0), last_night(datetime.date(2016, 5, 4)))
+
+            # date of the data itself is excluded
+            self.assertEqual((1, 10), last_night(datetime.date(2016, 5, 2)))
+
+            # date after the last date
+            self.assertEqual((0, 0), last_night(datetime.date(2016, 5, 10)))
+
+    def test_values_last_week(self):
+        df, date_values = self._dates_and_values()
+
+        for kwargs in (dict(), dict(date_values=date_values)):
+            def last_week(date):
+                return values_last_week(df, date, 'Date', ['A', 'B'], **kwargs)
+
+            # the first day of the week is included, the end date is excluded
+            self.assertEqual((15, 150), last_week(datetime.date(2016, 5, 8)))
+            self.assertEqual((7, 70), last_week(datetime.date(2016, 5, 6)))
+            self.assertEqual((14, 140), last_week(datetime.date(2016, 5, 9)))
+            self.assertEqual((0, 0), last_week(datetime.date(2016, 5, 1)))
+            self.assertEqual((0, 0), last_week(datetime.date(2016, 5, 14)))
+
+    def test_filter_days_to_date(self):
+        df, date_values = self._dates_and_values()
+
+        for kwargs in (dict(), dict(date_values=date_values)):
+            def filtered_dates(date, days):
+                return filter_days_to_date(df, date, days, 'Date', **kwargs).Date.tolist()
+
+            self.assertEqual([datetime.date(2016, 5, 4)], filtered_dates(datetime.date(2016, 5, 6), 2))
+            self.assertEqual([datetime.date(2016, 5, 2), datetime.date(2016, 5, 4)],
+                             filtered_dates(datetime.date(2016, 5, 6), 4))
+            self.assertEqual([datetime.date(2016, 5, 1), datetime.date(2016, 5, 2), datetime.date(2016, 5, 4)],
+                             filtered_dates(datetime.date(2016, 5, 6), 5))
+            self.assertEqual([], filtered_dates(datetime.date(2016, 5, 4), 1))
+            self.assertEqual([datetime.date(2016, 5, 6)], filtered_dates(datetime.date(2016, 5, 12), 6))
+            self.assertEqual([], filtered_dates(datetime.date(2016, 5, 12), 5))
+
+            self.assertEqual(df.Date.tolist(), filter_week_to_date(df, datetime.date(2016, 5, 8), 'Date', **kwargs)
+                             .Date.tolist())
+
+    def test_bin_by_semester_with_date_values(self):
+        dates = [datetime.date(2016, 4, 29),
+                 datetime.date(2016, 4, 30),
+                 datetime.date(2016, 5, 1),
+                 datetime.date(2016, 5, 3)]
+        df = pd.DataFrame(dict(Date=dates, A=[1, 2, 4, 8]))
+        date_values = to_date_values(df, 'Date')
+
+        for cutoff_date, semesters, sums in ((datetime.date(2016, 4, 30), ['2015-2'], [1]),
+                                             (datetime.date(2016, 5, 1), ['2015-2'], [3]),
+                                             (datetime.date(2016, 5, 3), ['2015-2', '2016-1'], [3, 4]),
+                                             (datetime.date(2016, 5, 4), ['2015-2', '2016-1'], [3, 12])):
+            for kwargs in (dict(), dict(date_values=date_values)):
+                binned = bin_by_semester(df, cutoff_date=cutoff_date, date_column='Date', semester_column='Semester',
+                                         **kwargs)
+                self.assertEqual(semesters, binned['Semester'].tolist())
+                self.assertEqual(sums, binned['A'].values.tolist())
+
+    def test_percentage(self):
+        self.assertEqual([25, 50, 150], percentage(np.array([1, 2, 6]), np.array([4, 4, 4])).tolist())
+
+        # zero denominator
+        with np.errstate(divide='ignore', invalid='ignore'):
+            p = percentage(np.array([1, 0]), np.array([0, 0]))
+        self.assertTrue(np.isinf(p[0]))
+        self.assertTrue(np.isnan(p[1]))
+
+    def test_running_bin_average(self):
+        df = pd.DataFrame(dict(x=[1, 3, 5, 9, 11, 15], y=[4, 3, 5, 1, 3, 1]))
+        self.assertAlmostEqual(1.8, running_bin_average(df, window=(5, 13), dx=2, ignore_missing_values=False))
+        self.assertAlmostEqual(3.0, running_bin_average(df, window=(5, 13), dx=2, ignore_missing_values=True))
+
+        # window boundaries are included
+        self.assertAlmostEqual(4.0, running_bin_average(df, window=(3, 5), dx=2, ignore_missing_values=True))
+
+        # empty window
+        self.assertEqual(0, running_bin_average(df, window=(17, 19), dx=2, ignore_missing_values=True))
+
+        # NaN values are treated as 0, but still count as a bin
+        df = pd.DataFrame(dict(x=[1, 3, 5, 7], y=[4, np.nan, 2, np.nan]))
+        self.assertAlmostEqual(1.5, running_bin_average(df, window=(1, 7), dx=2, ignore_missing_values=True))
+        self.assertAlmostEqual(1.5, running_bin_average(df, window=(1, 7), dx=2, ignore_missing_values=False))
+        self.assertAlmostEqual(1, running_bin_average(df, window=(3, 5), dx=2, ignore_missing_values=True))
+
+        with self.assertRaises(ValueError):
+            running_bin_average(df, window=(5, 5), dx=2, ignore_missing_values=True)
+
+
+class _CountingQueries(DateRangeQueries):
+    """Queries with a memoized query method which counts how often it is run."""
+
+    calls = []
+
+    @_memoized
+    def numbers(self):
+        self.calls.append(self.start)
+        time.sleep(0.05)
+        return pd.DataFrame(dict(Number=[1, 2, 3]))
+
+
+class TestQueries(unittest.TestCase):
+    def setUp(self):
+        _CountingQueries.calls = []
+        with _RESULTS_CACHE_LOCK:
+            _RESULTS_CACHE.clear()
+
+    def test_in_clause(self):
+        fragment, params = _in_clause('n', ['a', 'b', 'c'])
+        self.assertEqual('(:n_0, :n_1, :n_2)', fragment)
+        self.assertEqual(dict(n_0='a', n_1='b', n_2='c'), params)
+
+        fragment, params = _in_clause('n', ('a',))
+        self.assertEqual('(:n_0)', fragment)
+        self.assertEqual(dict(n_0='a'), params)
+
+        fragment, params = _in_clause('n', [])
+        self.assertEqual('()', fragment)
+        self.assertEqual(dict(), params)
+
+    def test_memoized_per_instance(self):
+        queries = _CountingQueries(datetime.date(2016, 1, 1), datetime.date(2016, 2, 1), 'test-connection')
+        df = queries.numbers()
+        self.assertIs(df, queries.numbers())
+        self.assertEqual([1, 2, 3], df.Number.tolist())
+        self.assertEqual(1, len(_CountingQueries.calls))
+
+    def test_memoized_across_instances(self):
+        start = datetime.date(2016, 1, 1)
+        end = datetime.date(2016, 2, 1)
+        df = _CountingQueries(start, end, 'test-connection').numbers()
+
+        # same date range and connection: the cached result is used, but as a copy
+        other_df = _CountingQueries(start, end, 'test-connection').numbers()
+        self.assertEqual(1, len(_CountingQueries.calls))
+        self.assertIsNot(df, other_df)
+        self.assertEqual(df.Number.tolist(), other_df.Number.tolist())
+
+        # different date range or connection: the query is run again
+        _CountingQueries(start, datetime.date(2016, 3, 1), 'test-connection').numbers()
+        self.assertEqual(2, len(_CountingQueries.calls))
+        _CountingQueries(start, end, 'other-test-connection').numbers()
+        self.assertEqual(3, len(_CountingQueries.calls))
+
+    def test_memoized_concurrent_calls(self):
+        queries = _CountingQueries(datetime.date(2016, 1, 1), datetime.date(2016, 2, 1), 'test-connection')
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(queries.numbers())) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, len(_CountingQueries.calls))
+        self.assertEqual(5, len(results))
+        for df in results:
+            self.assertIs(results[0], df)
+
+
+class TestMirrorRecoating(unittest.TestCase):
+    def test_segment_colors(self):
+        # the plot is created without calling the constructor, as the latter queries the database
+        plot = MirrorRecoatingPlot.__new__(MirrorRecoatingPlot)
+        plot.RECOATING_PERIOD = 365
+
+        def expected_color(days):
+            # reference implementation with colorsys
+            days = max(min(days, plot.RECOATING_PERIOD), 0)
+            l = 33 + 67 * days / plot.RECOATING_PERIOD
+            rgb = colorsys.hls_to_rgb(99 / 360, l / 100, 1)
+            return '#' + ''.join(format(int(round(255 * v)), '02x') for v in rgb)
+
+        today = datetime.datetime.now().date()
+        days = list(range(-5, 400))
+        dates = [today - datetime.timedelta(days=d) for d in days]
+        self.assertEqual([expected_color(d) for d in days], plot._segment_colors(dates))